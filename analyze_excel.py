@@ -1,38 +1,240 @@
+import argparse
+import json
 import os
-import pandas as pd
-from openpyxl import Workbook
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import Workbook, load_workbook
 from openpyxl.styles import Font, Alignment, PatternFill
+from company_store import CompanyStore, STORE_PATH, workbook_exhibitions
+
+# Header row of the exhibition sheet: the 4th non-empty row (same as pd.read_excel(header=3))
+HEADER_ROW = 3
+# Columns that are counted as contact information
+CONTACT_COLUMNS = ['Телефоны', 'Сайт', 'Email']
+# Column of the parser's company store for each contact column
+STORE_CONTACT_COLUMNS = {'Телефоны': 'phone', 'Сайт': 'site', 'Email': 'email'}
+# Number of worker processes for the analysis (None - one per CPU core)
+ANALYSIS_WORKERS = None
+# Per-file statistics of previous runs
+ANALYSIS_CACHE_PATH = 'analysis_cache.sqlite'
+# Bump when analyze_excel_file output changes, so old cache entries are recomputed
+ANALYSIS_VERSION = 2
+# Excel format of the share columns
+PERCENT_FORMAT = '0.0%'
+
+def is_empty(value):
+    return value is None or value == ''
+
+def iter_sheet_rows(file_path):
+    """Stream the sheet in read-only mode: yields the header row, then the data rows.
+
+    Only cell values are read, no DataFrame is built. Fully empty rows are
+    skipped the same way pd.read_excel(header=3) skips them.
+    """
+    wb = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        ws = wb.active
+        non_empty_rows = 0
+        for row in ws.iter_rows(values_only=True):
+            if all(is_empty(value) for value in row):
+                continue
+            if non_empty_rows == HEADER_ROW:
+                yield ['' if value is None else str(value) for value in row]
+            elif non_empty_rows > HEADER_ROW:
+                yield row
+            non_empty_rows += 1
+        if non_empty_rows <= HEADER_ROW:
+            raise ValueError("header row not found")
+    finally:
+        wb.close()
+
+def read_contact_counts(file_path):
+    """Count filled contact cells, the counts match the previous pandas-based analysis."""
+    rows = iter_sheet_rows(file_path)
+    columns = next(rows, None)
+    if columns is None:
+        raise ValueError("header row not found")
+    indices = {name: columns.index(name) for name in CONTACT_COLUMNS}
+    counts = dict.fromkeys(CONTACT_COLUMNS, 0)
+    total = 0
+    for row in rows:
+        total += 1
+        for name, idx in indices.items():
+            if idx < len(row) and not is_empty(row[idx]):
+                counts[name] += 1
+    return columns, total, counts
+
+def exhibition_name_from_path(file_path):
+    return os.path.basename(file_path).replace('участники выставки ', '').replace('.xlsx', '')
+
+def share(count, total):
+    """Numeric share (0.125 for 12.5%), shown with a percent format in the summary."""
+    return round(count / total, 3) if total > 0 else 0.0
 
 def analyze_excel_file(file_path):
     """Analyze a single Excel file and return statistics."""
-    # Read the Excel file starting from the 5th row where the actual data begins
-    df = pd.read_excel(file_path, header=3)  # header=3 means use row 4 (0-based) as headers
+    # Read only the values of the sheet, the header is in the 4th row
+    columns, total_companies, counts = read_contact_counts(file_path)
     
     # Print column names for debugging
     print(f"Columns in file {os.path.basename(file_path)}:")
-    print(df.columns.tolist())
+    print(columns)
     
     # Get exhibition name from filename
-    exhibition_name = os.path.basename(file_path).replace('участники выставки ', '').replace('.xlsx', '')
-    
+    return contact_statistics(exhibition_name_from_path(file_path), total_companies, counts)
+
+def contact_statistics(exhibition_name, total_companies, counts):
+    """Summary row of one exhibition from the filled contact counts."""
     # Count companies with different contact information
     # Using exact column names from the original Excel file
-    companies_with_phones = df[df['Телефоны'].notna() & (df['Телефоны'] != '')].shape[0]
-    companies_with_websites = df[df['Сайт'].notna() & (df['Сайт'] != '')].shape[0]
-    companies_with_emails = df[df['Email'].notna() & (df['Email'] != '')].shape[0]
-    total_companies = len(df)
+    companies_with_phones = counts['Телефоны']
+    companies_with_websites = counts['Сайт']
+    companies_with_emails = counts['Email']
     
+    # Percentages are numbers, so the summary sheet can be sorted on them
     return {
         'Выставка': exhibition_name,
         'Всего компаний': total_companies,
         'Компании с телефонами': companies_with_phones,
         'Компании с сайтами': companies_with_websites,
         'Компании с email': companies_with_emails,
-        'Процент с телефонами': f"{(companies_with_phones/total_companies*100):.1f}%" if total_companies > 0 else "0%",
-        'Процент с сайтами': f"{(companies_with_websites/total_companies*100):.1f}%" if total_companies > 0 else "0%",
-        'Процент с email': f"{(companies_with_emails/total_companies*100):.1f}%" if total_companies > 0 else "0%"
+        'Процент с телефонами': share(companies_with_phones, total_companies),
+        'Процент с сайтами': share(companies_with_websites, total_companies),
+        'Процент с email': share(companies_with_emails, total_companies)
     }
 
+def analyze_file_task(file_path):
+    """Worker task: (file, result, error) so one broken file doesn't stop the pool."""
+    try:
+        return file_path, analyze_excel_file(file_path), None
+    except Exception as e:
+        return file_path, None, e
+
+def analyze_files(file_paths, workers=ANALYSIS_WORKERS):
+    """Analyze files in a process pool, results are returned in the order of file_paths."""
+    if workers == 1 or len(file_paths) < 2:
+        return list(map(analyze_file_task, file_paths))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        chunksize = max(1, len(file_paths) // ((workers or os.cpu_count() or 1) * 4))
+        return list(executor.map(analyze_file_task, file_paths, chunksize=chunksize))
+
+def analyze_store(store_path=STORE_PATH, exhibitions=None):
+    """Statistics of the exhibitions in the parser's columnar store, no workbook is opened.
+
+    exhibitions - store entries to analyze (see workbook_exhibitions), default all of them.
+    Only the contact columns are read. Returns (Excel file, result, error) like analyze_files;
+    exhibition names and counts are the same as from the workbooks.
+    """
+    results = []
+    with CompanyStore(store_path) as store:
+        for exhibition in store.exhibitions() if exhibitions is None else exhibitions:
+            try:
+                columns = store.read_columns(exhibition['name'], list(STORE_CONTACT_COLUMNS.values()))
+                counts = {
+                    name: sum(1 for value in columns[column] if not is_empty(value))
+                    for name, column in STORE_CONTACT_COLUMNS.items()
+                }
+                result = contact_statistics(
+                    exhibition_name_from_path(exhibition['filename']), exhibition['rows'], counts
+                )
+                results.append((exhibition['filename'], result, None))
+            except Exception as e:
+                results.append((exhibition['filename'], None, e))
+    return results
+
+def file_signature(file_path):
+    """(mtime in ns, size) - changes whenever the workbook is rewritten."""
+    stat = os.stat(file_path)
+    return stat.st_mtime_ns, stat.st_size
+
+class AnalysisCache:
+    """Statistics of already analyzed workbooks (SQLite), keyed by path.
+
+    An entry is valid only while the file keeps the same mtime and size and
+    the analysis version is unchanged.
+    """
+
+    def __init__(self, path=ANALYSIS_CACHE_PATH):
+        self.db = sqlite3.connect(path)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS file_stats (
+                path TEXT PRIMARY KEY,
+                mtime_ns INTEGER NOT NULL,
+                size INTEGER NOT NULL,
+                version INTEGER NOT NULL,
+                result TEXT NOT NULL
+            )
+        ''')
+        self.db.commit()
+
+    def get(self, file_path):
+        """Cached result for an unchanged file, otherwise None."""
+        row = self.db.execute(
+            'SELECT mtime_ns, size, version, result FROM file_stats WHERE path = ?', (file_path,)
+        ).fetchone()
+        if row is None:
+            return None
+        mtime_ns, size, version, result = row
+        if (mtime_ns, size) != file_signature(file_path) or version != ANALYSIS_VERSION:
+            return None
+        return json.loads(result)
+
+    def store(self, file_path, signature, result):
+        mtime_ns, size = signature
+        self.db.execute(
+            'INSERT OR REPLACE INTO file_stats (path, mtime_ns, size, version, result) VALUES (?, ?, ?, ?, ?)',
+            (file_path, mtime_ns, size, ANALYSIS_VERSION, json.dumps(result, ensure_ascii=False))
+        )
+
+    def prune(self, file_paths):
+        """Remove entries of files that no longer exist."""
+        keep = set(file_paths)
+        stale = [(path,) for (path,) in self.db.execute('SELECT path FROM file_stats') if path not in keep]
+        self.db.executemany('DELETE FROM file_stats WHERE path = ?', stale)
+        return len(stale)
+
+    def commit(self):
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+def analyze_incremental(file_paths, cache, workers=ANALYSIS_WORKERS):
+    """Analyze only new or modified files, reuse cached results for the rest.
+
+    Returns (file, result, error) in the order of file_paths.
+    """
+    cached = {}
+    changed = []
+    signatures = {}
+    for file_path in file_paths:
+        result = cache.get(file_path)
+        if result is not None:
+            cached[file_path] = result
+        else:
+            # Signature is taken before reading, a file rewritten during the run is re-read next time
+            signatures[file_path] = file_signature(file_path)
+            changed.append(file_path)
+    print(f"Без изменений: {len(cached)}, новых или измененных: {len(changed)}")
+
+    analyzed = {}
+    for file_path, result, error in analyze_files(changed, workers):
+        analyzed[file_path] = (result, error)
+        if error is None:
+            cache.store(file_path, signatures[file_path], result)
+    removed = cache.prune(file_paths)
+    if removed:
+        print(f"Удалено из кэша записей об отсутствующих файлах: {removed}")
+    cache.commit()
+
+    results = []
+    for file_path in file_paths:
+        if file_path in cached:
+            results.append((file_path, cached[file_path], None))
+        else:
+            results.append((file_path, *analyzed[file_path]))
+    return results
+
 def create_summary_excel(results):
     """Create a summary Excel file with analysis results."""
     wb = Workbook()
@@ -66,14 +268,12 @@ def create_summary_excel(results):
     # Write data
     times_new_roman = Font(name='Times New Roman')
     for row, result in enumerate(results, 2):
-        ws.cell(row=row, column=1, value=result['Выставка']).font = times_new_roman
-        ws.cell(row=row, column=2, value=result['Всего компаний']).font = times_new_roman
-        ws.cell(row=row, column=3, value=result['Компании с телефонами']).font = times_new_roman
-        ws.cell(row=row, column=4, value=result['Процент с телефонами']).font = times_new_roman
-        ws.cell(row=row, column=5, value=result['Компании с сайтами']).font = times_new_roman
-        ws.cell(row=row, column=6, value=result['Процент с сайтами']).font = times_new_roman
-        ws.cell(row=row, column=7, value=result['Компании с email']).font = times_new_roman
-        ws.cell(row=row, column=8, value=result['Процент с email']).font = times_new_roman
+        for col, header in enumerate(headers, 1):
+            cell = ws.cell(row=row, column=col, value=result[header])
+            cell.font = times_new_roman
+            # Shares are stored as numbers and shown as percents
+            if header.startswith('Процент'):
+                cell.number_format = PERCENT_FORMAT
     
     # Adjust column widths
     column_widths = {
@@ -98,26 +298,54 @@ def create_summary_excel(results):
     print("Анализ сохранен в файл: excel/анализ_выставок.xlsx")
 
 def main():
+    arg_parser = argparse.ArgumentParser(description='Analysis of exhibition Excel files')
+    arg_parser.add_argument('--workers', type=int, default=ANALYSIS_WORKERS,
+                            help='number of worker processes (default: one per CPU core, 1 - no pool)')
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help=f're-read all files, ignoring the statistics cache ({ANALYSIS_CACHE_PATH})')
+    arg_parser.add_argument('--store', default=STORE_PATH,
+                            help='company store written by parser.py (default: %(default)s)')
+    arg_parser.add_argument('--from-excel', action='store_true',
+                            help='read the Excel files even if the company store exists')
+    args = arg_parser.parse_args()
+    
     # Create excel directory if it doesn't exist
     os.makedirs('excel', exist_ok=True)
     
     # Get all Excel files in the excel directory
-    excel_files = [f for f in os.listdir('excel') if f.startswith('участники выставки') and f.endswith('.xlsx')]
+    excel_files = [f for f in os.listdir('excel') if 'участники выставки' in f and f.endswith('.xlsx')]
     
     if not excel_files:
         print("Не найдены файлы Excel для анализа в папке 'excel'")
         return
     
-    # Analyze each file
-    results = []
-    for file in excel_files:
-        print(f"Анализируем файл: {file}")
-        file_path = os.path.join('excel', file)
+    # The parser's store has the same data in columns, no workbook has to be parsed,
+    # as long as it has every file of the folder and none was changed after the parser wrote it;
+    # otherwise files are analyzed in parallel, one process per CPU core,
+    # and unchanged files are taken from the cache of previous runs
+    file_paths = [os.path.join('excel', file) for file in excel_files]
+    exhibitions = None if args.from_excel else workbook_exhibitions(args.store, file_paths)
+    if exhibitions is None and not args.from_excel and os.path.exists(args.store):
+        print(f"Хранилище {args.store} не совпадает с файлами в папке 'excel', анализируем файлы")
+    if exhibitions is not None:
+        print(f"Анализируем выставки из хранилища: {args.store}")
+        analyzed = analyze_store(args.store, exhibitions)
+    elif args.no_cache:
+        print(f"Анализируем файлов: {len(excel_files)}")
+        analyzed = analyze_files(file_paths, args.workers)
+    else:
+        print(f"Анализируем файлов: {len(excel_files)}")
+        cache = AnalysisCache(ANALYSIS_CACHE_PATH)
         try:
-            result = analyze_excel_file(file_path)
+            analyzed = analyze_incremental(file_paths, cache, args.workers)
+        finally:
+            cache.close()
+    results = []
+    for file_path, result, error in analyzed:
+        if error is not None:
+            print(f"Ошибка при анализе файла {os.path.basename(file_path)}: {error}")
+        else:
             results.append(result)
-        except Exception as e:
-            print(f"Ошибка при анализе файла {file}: {e}")
     
     if results:
         create_summary_excel(results)
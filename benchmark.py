@@ -0,0 +1,351 @@
+import argparse
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import analyze_excel
+import catalogue_stats
+import encrypt_excel
+from company_store import Company, CompanyStore, STORE_PATH
+from excel_writer import StreamingExcelWriter, TEMPLATE_PATH, exhibition_filename, read_template_config
+
+# Файл с результатами замеров
+BENCH_OUTPUT_PATH = 'bench_output.json'
+# Папка проекта (рядом с benchmark.py)
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def load_expo_parser(repo_dir=REPO_DIR):
+    """parser.py проекта по пути к файлу: в сборках Python 3.9 для Windows
+    import parser загружает одноименный встроенный модуль стандартной библиотеки"""
+    spec = importlib.util.spec_from_file_location('expo_parser', os.path.join(repo_dir, 'parser.py'))
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+expo_parser = load_expo_parser()
+
+RUBRICS = ['Машиностроение', 'Электроника', 'Строительство', 'Пищевая промышленность',
+           'Медицина', 'Логистика', 'Химия', 'Энергетика']
+
+
+def company_details(company_id):
+    """Детерминированные данные синтетической компании (часть полей пустая)"""
+    rng = random.Random(company_id)
+    return {
+        'Телефон': f'+7 (495) {company_id % 1000:03d}-{company_id % 100:02d}-{rng.randint(0, 99):02d}'
+        if rng.random() < 0.8 else '',
+        'E-mail': f'info@company{company_id}.ru' if rng.random() < 0.6 else '',
+        'Сайт': f'www.company{company_id}.ru' if rng.random() < 0.7 else '',
+        'Рубрика': '; '.join(rng.sample(RUBRICS, rng.randint(1, 3)))
+    }
+
+
+class FixtureCatalogue:
+    """Локальная копия каталога expocentr: главная страница со списком выставок,
+    страницы /list с таблицей #fresh-table и страницы компаний с блоком .dl-horizontal
+
+    shared - доля компаний выставки, общих для всех выставок (проверка индекса компаний),
+    latency_ms - задержка каждого ответа,
+    page_size - компаний на странице списка (0 - весь список на одной странице,
+    иначе страницы ?page=N со ссылками постраничной навигации)
+    """
+
+    def __init__(self, exhibitions=5, companies=200, shared=0.3, latency_ms=20, page_size=0):
+        self.exhibitions = exhibitions
+        self.companies = companies
+        self.shared = int(companies * shared)
+        self.latency = latency_ms / 1000
+        self.page_size = page_size
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server.server_port}/ru'
+
+    def company_id(self, exhibition, row):
+        if row < self.shared:
+            return row
+        return self.shared + exhibition * self.companies + row
+
+    def main_page(self):
+        links = ''.join(
+            f'<a class="list-group-item list-group-item-action" href="/ru/exhibition-{e}">'
+            f'Выставка {e} 2025</a>'
+            for e in range(self.exhibitions)
+        )
+        return f'<div class="list-group">{links}</div>'
+
+    def list_page(self, exhibition, page=1):
+        page_size = self.page_size or self.companies
+        pages = max(1, -(-self.companies // page_size))
+        if not 1 <= page <= pages:
+            return None
+        rows = ''.join(
+            f'<tr><td><a href="/ru/company/{self.company_id(exhibition, row)}">'
+            f'Компания {self.company_id(exhibition, row)}</a></td><td>Павильон {row % 8}</td></tr>'
+            for row in range((page - 1) * page_size, min(page * page_size, self.companies))
+        )
+        table = f'<table id="fresh-table"><thead><tr><th>Название</th></tr></thead><tbody>{rows}</tbody></table>'
+        if pages == 1:
+            return table
+        links = ''.join(f'<li><a href="?page={number}">{number}</a></li>' for number in range(1, pages + 1))
+        return f'{table}<ul class="pagination">{links}</ul>'
+
+    def detail_page(self, company_id):
+        details = company_details(company_id)
+        spans = ''.join(f'<span class="label label-primary">{rubric}</span> '
+                        for rubric in details['Рубрика'].split('; '))
+        return (
+            '<dl class="dl-horizontal">'
+            f'<dt>Телефон:</dt><dd>{details["Телефон"]}</dd>'
+            f'<dt>E-mail:</dt><dd><a href="mailto:{details["E-mail"]}">{details["E-mail"]}</a></dd>'
+            f'<dt>Сайт:</dt><dd><a href="http://{details["Сайт"]}">{details["Сайт"]}</a></dd>'
+            f'<dt>Рубрики:</dt><dd>{spans}</dd>'
+            '</dl>'
+        )
+
+    def page(self, path):
+        path, query = urlsplit(path)[2:4]
+        if path == '/ru':
+            return self.main_page()
+        if path.startswith('/ru/exhibition-') and path.endswith('/list'):
+            page = int(parse_qs(query).get('page', ['1'])[0])
+            return self.list_page(int(path[len('/ru/exhibition-'):-len('/list')]), page)
+        if path.startswith('/ru/company/'):
+            return self.detail_page(int(path[len('/ru/company/'):]))
+        return None
+
+    def _handler(self):
+        catalogue = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                with catalogue.lock:
+                    catalogue.requests += 1
+                if catalogue.latency:
+                    time.sleep(catalogue.latency)
+                try:
+                    body = catalogue.page(self.path)
+                except ValueError:
+                    body = None
+                if body is None:
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                data = f'<html><body>{body}</body></html>'.encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class Measure:
+    """Время и пиковая память (tracemalloc, только текущий процесс) одного замера"""
+
+    def __init__(self, track_memory=True):
+        self.track_memory = track_memory
+        self.seconds = None
+        self.peak_mb = None
+
+    def __enter__(self):
+        if self.track_memory:
+            tracemalloc.start()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.seconds = time.perf_counter() - self.start
+        if self.track_memory:
+            self.peak_mb = round(tracemalloc.get_traced_memory()[1] / 1024 / 1024, 2)
+            tracemalloc.stop()
+
+
+def write_template(workdir, repo_dir):
+    """Настройки шапки для рабочей папки (с абсолютным путем к логотипу)"""
+    config = read_template_config(os.path.join(repo_dir, TEMPLATE_PATH))
+    config['logo'] = os.path.join(repo_dir, config['logo'])
+    with open(os.path.join(workdir, TEMPLATE_PATH), 'w', encoding='utf-8') as f:
+        json.dump(config, f, ensure_ascii=False)
+
+
+def bench_scrape(args, track_memory):
+    """Полный обход локального каталога: сначала по сети, затем повторно только из кэша"""
+    results = {}
+    with FixtureCatalogue(args.exhibitions, args.companies, args.shared, args.latency_ms,
+                          args.page_size) as catalogue:
+        for name, offline in (('scrape', False), ('scrape_from_cache', True)):
+            requests_before = catalogue.requests
+            with Measure(track_memory) as measure, contextlib.redirect_stdout(io.StringIO()):
+                expo_parser.parse_expocentr(
+                    catalogue.url, use_cache=True, offline=offline,
+                    report_path=f'run_report_{name}.json',
+                    requests_per_second=args.rps, max_concurrent=args.max_concurrent
+                )
+            with open(f'run_report_{name}.json', encoding='utf-8') as f:
+                report = json.load(f)
+            companies = args.exhibitions * args.companies
+            results[name] = {
+                'seconds': round(measure.seconds, 3),
+                'peak_memory_mb': measure.peak_mb,
+                'server_requests': catalogue.requests - requests_before,
+                'companies_per_second': round(companies / measure.seconds, 1),
+                'fetch_latency': report['stages'].get('fetch'),
+                'parse_details_latency': report['stages'].get('parse_details'),
+                'excel_write_latency': report['stages'].get('excel_write'),
+                'cache': report['cache'],
+                'errors': report['errors']
+            }
+    return results
+
+
+def generate_workbooks(count, rows):
+    """Синтетические Excel файлы выставок в формате save_to_excel и те же данные
+    в колоночном хранилище (как после запуска парсера)"""
+    os.makedirs('excel', exist_ok=True)
+    paths = []
+    with CompanyStore(STORE_PATH) as store:
+        for e in range(count):
+            name = f'Синтетическая выставка {e} 2025'
+            path = exhibition_filename(name)
+            companies = []
+            for row in range(rows):
+                company_id = (e * rows + row) if row % 3 else row
+                companies.append(Company.from_details(
+                    f'Компания {company_id}', f'http://127.0.0.1/ru/company/{company_id}',
+                    company_details(company_id)
+                ))
+            with StreamingExcelWriter(path) as writer:
+                writer.write_companies(companies)
+            store.write_exhibition({'text': name, 'url': f'http://127.0.0.1/ru/exhibition-{e}'}, companies, path)
+            paths.append(path)
+    return paths
+
+
+def bench_files(args, track_memory):
+    """Анализ, статистика каталога и демо-версии на синтетических Excel файлах"""
+    results = {}
+    with Measure(False) as measure:
+        paths = generate_workbooks(args.workbooks, args.rows)
+    results['generate_workbooks'] = {'seconds': round(measure.seconds, 3), 'files': len(paths)}
+    rows = args.workbooks * args.rows
+
+    # Те же этапы по Excel файлам и по колоночному хранилищу
+    stages = [
+        ('analysis', lambda: analyze_excel.analyze_files(paths, args.workers)),
+        ('analysis_store', lambda: analyze_excel.analyze_store(STORE_PATH)),
+        ('catalogue_stats', lambda: catalogue_stats.compute_statistics(
+            catalogue_stats.load_from_workbooks(paths, args.workers))),
+        ('catalogue_stats_store', lambda: catalogue_stats.compute_statistics(
+            catalogue_stats.load_from_store(STORE_PATH))),
+        ('demo', lambda: encrypt_excel.create_demo_versions(paths, args.workers)),
+        ('demo_store', lambda: encrypt_excel.create_demo_versions_from_store(STORE_PATH, args.workers)),
+    ]
+    for name, stage in stages:
+        with Measure(track_memory) as measure, contextlib.redirect_stdout(io.StringIO()):
+            stage()
+        results[name] = {
+            'seconds': round(measure.seconds, 3),
+            'peak_memory_mb': measure.peak_mb,
+            'files_per_second': round(len(paths) / measure.seconds, 1),
+            'rows_per_second': round(rows / measure.seconds, 1)
+        }
+    return results
+
+
+def print_results(results):
+    print(f"\n{'Замер':<22}{'Время, с':>10}{'Память, МБ':>12}  Скорость")
+    for name, result in results.items():
+        speed = next((f'{result[key]} {key}' for key in
+                      ('companies_per_second', 'rows_per_second') if key in result), '')
+        memory = result.get('peak_memory_mb')
+        print(f"{name:<22}{result['seconds']:>10}{memory if memory is not None else '-':>12}  {speed}")
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Замеры скорости парсера, анализа и демо-версий без обращения к сайту'
+    )
+    arg_parser.add_argument('--only', default='scrape,files',
+                            help='какие замеры выполнить: scrape, files (по умолчанию %(default)s)')
+    arg_parser.add_argument('--exhibitions', type=int, default=5, help='выставок в локальном каталоге')
+    arg_parser.add_argument('--companies', type=int, default=200, help='компаний на выставке')
+    arg_parser.add_argument('--shared', type=float, default=0.3,
+                            help='доля компаний, участвующих во всех выставках')
+    arg_parser.add_argument('--page-size', type=int, default=0,
+                            help='компаний на странице списка выставки (0 - без постраничной навигации)')
+    arg_parser.add_argument('--latency-ms', type=float, default=20, help='задержка ответа локального сайта')
+    arg_parser.add_argument('--rps', type=float, default=0,
+                            help='лимит запросов в секунду (0 - без лимита, на сайте используется '
+                                 f'{expo_parser.REQUESTS_PER_SECOND})')
+    arg_parser.add_argument('--max-concurrent', type=int, default=expo_parser.MAX_CONCURRENT_REQUESTS,
+                            help='одновременных запросов (по умолчанию %(default)s)')
+    arg_parser.add_argument('--workbooks', type=int, default=50, help='синтетических Excel файлов')
+    arg_parser.add_argument('--rows', type=int, default=500, help='компаний в каждом Excel файле')
+    arg_parser.add_argument('--workers', type=int, default=None, help='процессов для анализа и демо-версий')
+    arg_parser.add_argument('--no-memory', action='store_true',
+                            help='не измерять память (tracemalloc замедляет работу)')
+    arg_parser.add_argument('--output', default=BENCH_OUTPUT_PATH, help='файл с результатами в формате JSON')
+    arg_parser.add_argument('--keep', action='store_true', help='не удалять рабочую папку с файлами замеров')
+    args = arg_parser.parse_args()
+
+    selected = set(args.only.split(','))
+    track_memory = not args.no_memory
+    output = os.path.abspath(args.output)
+
+    # Все файлы замеров (Excel, кэш, журнал) создаются во временной папке
+    workdir = tempfile.mkdtemp(prefix='expo_bench_')
+    write_template(workdir, REPO_DIR)
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    results = {}
+    try:
+        if 'scrape' in selected:
+            results.update(bench_scrape(args, track_memory))
+        if 'files' in selected:
+            results.update(bench_files(args, track_memory))
+    finally:
+        os.chdir(cwd)
+        if args.keep:
+            print(f"Рабочая папка: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump({'parameters': vars(args), 'results': results}, f, ensure_ascii=False, indent=2)
+    print(f"\nРезультаты сохранены в файл: {output}")
+
+
+if __name__ == '__main__':
+    main()
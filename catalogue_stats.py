@@ -0,0 +1,224 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from openpyxl.utils import get_column_letter
+
+from analyze_excel import (
+    ANALYSIS_WORKERS, PERCENT_FORMAT, exhibition_name_from_path, is_empty, iter_sheet_rows
+)
+from company_store import CompanyStore, STORE_PATH, workbook_exhibitions
+from jsonl_export import EXPORT_PATH, iter_records
+
+# Columns of the exhibition sheet that go into the catalogue frame
+DATA_COLUMNS = ['Название', 'Рубрика', 'Телефоны', 'Email', 'Сайт']
+# Column of the parser's company store for each data column
+STORE_COLUMNS = {'Название': 'text', 'Рубрика': 'rubric', 'Телефоны': 'phone', 'Email': 'email', 'Сайт': 'site'}
+# Contact column -> (count column, share column) of the statistics tables
+CONTACT_STATS = {
+    'Телефоны': ('Компании с телефонами', 'Процент с телефонами'),
+    'Сайт': ('Компании с сайтами', 'Процент с сайтами'),
+    'Email': ('Компании с email', 'Процент с email'),
+}
+# Separator of categories in the 'Рубрика' column
+RUBRIC_SEPARATOR = '; '
+STATS_PATH = 'excel/статистика_каталога.xlsx'
+
+def read_exhibition_columns(file_path):
+    """Data columns of one exhibition workbook as lists (one list per column)."""
+    rows = iter_sheet_rows(file_path)
+    header = next(rows)
+    indices = [header.index(name) for name in DATA_COLUMNS]
+    columns = {name: [] for name in DATA_COLUMNS}
+    for row in rows:
+        for name, idx in zip(DATA_COLUMNS, indices):
+            value = row[idx] if idx < len(row) else None
+            columns[name].append('' if is_empty(value) else str(value))
+    return exhibition_name_from_path(file_path), columns
+
+def build_frame(exhibitions):
+    """One columnar frame from (exhibition name, {column: values}) pairs."""
+    names = []
+    data = {name: [] for name in DATA_COLUMNS}
+    for exhibition_name, columns in exhibitions:
+        names.extend([exhibition_name] * len(columns['Название']))
+        for name in DATA_COLUMNS:
+            data[name].extend(columns[name])
+    frame = pd.DataFrame(data, columns=DATA_COLUMNS)
+    frame.insert(0, 'Выставка', pd.Categorical(names))
+    return frame
+
+def load_from_workbooks(file_paths, workers=ANALYSIS_WORKERS):
+    """Read all exhibition workbooks (in a process pool) into one frame."""
+    if workers == 1 or len(file_paths) < 2:
+        return build_frame(map(read_exhibition_columns, file_paths))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return build_frame(executor.map(read_exhibition_columns, file_paths))
+
+def load_from_jsonl(path=EXPORT_PATH):
+    """Build the frame from the parser's JSONL export instead of the workbooks."""
+    exhibitions = {}
+    for record in iter_records(path):
+        details = record.get('details') or {}
+        columns = exhibitions.setdefault(record['exhibition_name'], {name: [] for name in DATA_COLUMNS})
+        columns['Название'].append(record['text'])
+        columns['Рубрика'].append(details.get('Рубрика', ''))
+        columns['Телефоны'].append(details.get('Телефон', ''))
+        columns['Email'].append(details.get('E-mail', ''))
+        columns['Сайт'].append(details.get('Сайт', ''))
+    return build_frame(exhibitions.items())
+
+def load_from_store(path=STORE_PATH, exhibitions=None):
+    """Build the frame from the parser's columnar store, no workbook is parsed.
+
+    exhibitions - store entries to read (see workbook_exhibitions), default all of them.
+    """
+    frames = []
+    with CompanyStore(path) as store:
+        for exhibition in store.exhibitions() if exhibitions is None else exhibitions:
+            columns = store.read_columns(exhibition['name'], list(STORE_COLUMNS.values()))
+            frames.append((
+                exhibition_name_from_path(exhibition['filename']),
+                {name: ['' if is_empty(value) else value for value in columns[column]]
+                 for name, column in STORE_COLUMNS.items()}
+            ))
+    return build_frame(frames)
+
+def normalize_names(names):
+    """Company identity for the overlap: case, quotes and extra spaces are ignored."""
+    return (names.str.casefold()
+            .str.replace(r'[«»"\'“”]', '', regex=True)
+            .str.replace(r'\s+', ' ', regex=True)
+            .str.strip())
+
+def add_shares(table, total_column):
+    """Numeric share columns next to the contact counts."""
+    for count_column, share_column in CONTACT_STATS.values():
+        table[share_column] = (table[count_column] / table[total_column]).fillna(0).round(3)
+    return table
+
+def compute_statistics(frame):
+    """All statistics tables from the catalogue frame, computed on whole columns.
+
+    Returns {sheet name: DataFrame}: per-exhibition and global contact coverage,
+    per-rubric breakdown and companies present in several exhibitions.
+    """
+    filled = frame[list(CONTACT_STATS)].ne('')
+    filled.columns = [count_column for count_column, _ in CONTACT_STATS.values()]
+    company = normalize_names(frame['Название'])
+
+    # Companies taking part in more than one exhibition
+    pairs = pd.DataFrame({'company': company, 'Выставка': frame['Выставка']}).drop_duplicates()
+    exhibitions_per_company = pairs.groupby('company', sort=False).size()
+    pairs['shared'] = pairs['company'].map(exhibitions_per_company) > 1
+
+    # Coverage per exhibition
+    by_exhibition = filled.groupby(frame['Выставка'], observed=True)
+    exhibitions = by_exhibition.sum()
+    exhibitions.insert(0, 'Всего компаний', by_exhibition.size())
+    add_shares(exhibitions, 'Всего компаний')
+    exhibitions['Компании на других выставках'] = (
+        pairs.groupby('Выставка', observed=True)['shared'].sum().reindex(exhibitions.index, fill_value=0)
+    )
+    exhibitions['Процент на других выставках'] = (
+        exhibitions['Компании на других выставках'] / exhibitions['Всего компаний']
+    ).fillna(0).round(3)
+    exhibitions = exhibitions.reset_index()
+
+    # Whole catalogue
+    totals = filled.sum()
+    catalogue = pd.DataFrame([{
+        'Выставок': frame['Выставка'].nunique(),
+        'Всего записей': len(frame),
+        'Уникальных компаний': len(exhibitions_per_company),
+        **totals.to_dict(),
+        'Компании на нескольких выставках': int((exhibitions_per_company > 1).sum()),
+    }])
+    add_shares(catalogue, 'Всего записей')
+
+    # Breakdown by rubric: one row per (company record, category)
+    rubrics = filled.assign(
+        Рубрика=frame['Рубрика'].str.split(RUBRIC_SEPARATOR),
+        Выставка=frame['Выставка'],
+        company=company
+    ).explode('Рубрика')
+    rubrics = rubrics[rubrics['Рубрика'].notna() & rubrics['Рубрика'].ne('')]
+    by_rubric = rubrics.groupby('Рубрика')
+    rubric_table = by_rubric[filled.columns.tolist()].sum()
+    rubric_table.insert(0, 'Всего компаний', by_rubric.size())
+    rubric_table.insert(1, 'Уникальных компаний', by_rubric['company'].nunique())
+    rubric_table.insert(2, 'Выставок', by_rubric['Выставка'].nunique())
+    add_shares(rubric_table, 'Всего компаний')
+    rubric_table = rubric_table.sort_values('Всего компаний', ascending=False).reset_index()
+
+    # Companies seen in several exhibitions
+    shared = pairs[pairs['shared']]
+    first_names = frame['Название'].groupby(company, sort=False).first()
+    overlap = shared.groupby('company', sort=False)['Выставка'].agg(
+        lambda names: RUBRIC_SEPARATOR.join(sorted(map(str, names)))
+    )
+    overlap = pd.DataFrame({
+        'Компания': first_names.reindex(overlap.index).values,
+        'Выставок': exhibitions_per_company.reindex(overlap.index).values,
+        'Выставки': overlap.values,
+    }).sort_values(['Выставок', 'Компания'], ascending=[False, True])
+
+    return {
+        'Каталог': catalogue,
+        'Выставки': exhibitions,
+        'Рубрики': rubric_table,
+        'Пересечения': overlap,
+    }
+
+def save_statistics(tables, path=STATS_PATH):
+    """One sheet per table; share columns keep numeric values with a percent format."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for sheet_name, table in tables.items():
+            table.to_excel(writer, sheet_name=sheet_name, index=False)
+            ws = writer.sheets[sheet_name]
+            for col, name in enumerate(table.columns, 1):
+                letter = get_column_letter(col)
+                ws.column_dimensions[letter].width = max(15, min(60, len(str(name)) + 2))
+                if name.startswith('Процент'):
+                    for cell in ws[letter][1:]:
+                        cell.number_format = PERCENT_FORMAT
+            ws.auto_filter.ref = ws.dimensions
+    print(f"Статистика сохранена в файл: {path}")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Cross-exhibition statistics of the whole catalogue')
+    arg_parser.add_argument('--jsonl', nargs='?', const=EXPORT_PATH,
+                            help=f'read the parser export instead of the workbooks (default {EXPORT_PATH})')
+    arg_parser.add_argument('--workers', type=int, default=ANALYSIS_WORKERS,
+                            help='number of worker processes for reading workbooks')
+    arg_parser.add_argument('--store', default=STORE_PATH,
+                            help='company store written by parser.py (default: %(default)s)')
+    arg_parser.add_argument('--from-excel', action='store_true',
+                            help='read the workbooks even if the company store exists')
+    args = arg_parser.parse_args()
+
+    if args.jsonl:
+        frame = load_from_jsonl(args.jsonl)
+    else:
+        excel_files = sorted(f for f in os.listdir('excel') if 'участники выставки' in f and f.endswith('.xlsx')) \
+            if os.path.isdir('excel') else []
+        if not excel_files:
+            print("Не найдены файлы Excel для анализа в папке 'excel'")
+            return
+        file_paths = [os.path.join('excel', f) for f in excel_files]
+        # The store is used only while it has every workbook of the folder, unchanged since the parser wrote it
+        exhibitions = None if args.from_excel else workbook_exhibitions(args.store, file_paths)
+        if exhibitions is not None:
+            frame = load_from_store(args.store, exhibitions)
+        else:
+            if not args.from_excel and os.path.exists(args.store):
+                print(f"Хранилище {args.store} не совпадает с файлами в папке 'excel', читаем файлы")
+            frame = load_from_workbooks(file_paths, args.workers)
+
+    print(f"Загружено записей: {len(frame)}, выставок: {frame['Выставка'].nunique()}")
+    save_statistics(compute_statistics(frame))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+import json
+import re
+import threading
+from urllib.parse import urlsplit, urlunsplit
+
+from jsonl_export import open_jsonl
+
+# Файл с уникальными компаниями всех выставок
+MASTER_PATH = 'companies_master.jsonl'
+
+# Общие почтовые сервисы: по домену таких адресов компанию не отличить,
+# поэтому ключом служит адрес целиком
+PUBLIC_MAIL_DOMAINS = frozenset([
+    'mail.ru', 'bk.ru', 'inbox.ru', 'list.ru', 'internet.ru',
+    'yandex.ru', 'yandex.com', 'ya.ru', 'rambler.ru',
+    'gmail.com', 'googlemail.com', 'yahoo.com', 'hotmail.com', 'outlook.com', 'icloud.com'
+])
+# Соцсети и хостинги: на одном хосте страницы разных компаний, поэтому
+# ключом служит адрес страницы (или почтовый адрес) целиком, а не домен
+SHARED_HOSTS = frozenset([
+    'vk.com', 'vk.ru', 'vkontakte.ru', 'ok.ru', 'my.mail.ru', 't.me', 'telegram.me', 'wa.me',
+    'facebook.com', 'fb.com', 'instagram.com', 'twitter.com', 'x.com', 'youtube.com', 'livejournal.com',
+    'narod.ru', 'narod2.ru', 'ucoz.ru', 'ucoz.net', 'ucoz.com', 'tilda.ws', 'tilda.site', 'tilda.cc',
+    'wixsite.com', 'wix.com', 'blogspot.com', 'wordpress.com', 'sites.google.com', 'site.yandex.ru',
+    'nethouse.ru', 'taplink.cc', 'jimdo.com', 'github.io'
+])
+# Организационно-правовые формы, которые не различают компании в названии
+LEGAL_FORMS = frozenset(['ооо', 'оао', 'зао', 'пао', 'ао', 'ип', 'нпо', 'нпп', 'тд', 'гк',
+                         'llc', 'ltd', 'inc', 'gmbh', 'co'])
+# Разделители нескольких значений в одном поле
+MULTI_VALUE_SEPARATOR = re.compile(r'[,;\s]+')
+PHONE_SEPARATOR = re.compile(r'[,;]')
+NON_DIGITS = re.compile(r'\D')
+NON_WORD = re.compile(r'\W+')
+
+
+def normalize_url(url):
+    """URL страницы компании без различий в регистре хоста, завершающем / и якоре"""
+    parts = urlsplit(url.strip())
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), parts.query, ''))
+
+
+def normalize_phones(text):
+    """Номера телефонов из поля 'Телефон' в виде цифр с кодом страны (7XXXXXXXXXX)"""
+    phones = []
+    for part in PHONE_SEPARATOR.split(text or ''):
+        digits = NON_DIGITS.sub('', part)
+        if len(digits) == 11 and digits[0] == '8':
+            digits = '7' + digits[1:]
+        elif len(digits) == 10:
+            digits = '7' + digits
+        if len(digits) >= 7:
+            phones.append(digits)
+    return phones
+
+
+def _split_site(site):
+    site = (site or '').strip()
+    if not site:
+        return None
+    if '://' not in site:
+        site = 'http://' + site
+    try:
+        parts = urlsplit(site)
+        host = parts.hostname
+    except ValueError:
+        return None
+    if not host:
+        return None
+    return (host[4:] if host.startswith('www.') else host), parts.path.rstrip('/').lower()
+
+
+def site_host(site):
+    """Хост сайта без www: 'https://www.example.ru/about' -> 'example.ru'"""
+    parts = _split_site(site)
+    return parts[0] if parts else None
+
+
+def is_shared_host(host):
+    """Хост общего сервиса (соцсеть, хостинг, почта), включая его поддомены"""
+    return any(host == shared or host.endswith('.' + shared)
+               for shared in SHARED_HOSTS | PUBLIC_MAIL_DOMAINS)
+
+
+def normalize_name(text):
+    """Название компании без регистра, кавычек, знаков и организационно-правовой формы"""
+    words = NON_WORD.sub(' ', (text or '').lower()).split()
+    return ' '.join(word for word in words if word not in LEGAL_FORMS)
+
+
+def email_keys(text, name=''):
+    """Ключи по email: домен компании вместе с названием или весь адрес на общем сервисе"""
+    keys = []
+    for address in MULTI_VALUE_SEPARATOR.split((text or '').strip().lower()):
+        if '@' not in address:
+            continue
+        domain = address.rsplit('@', 1)[1]
+        if not domain:
+            continue
+        if is_shared_host(domain):
+            keys.append('email:' + address)
+        elif name:
+            keys.append(f'domain:{domain}:{name}')
+    return keys
+
+
+def identity_keys(company):
+    """Ключи, по которым записи (Company) разных выставок считаются одной компанией:
+    страница компании, телефоны, адрес почты или страницы на общем сервисе, а также
+    домен почты или сайта вместе с названием (один домен без названия записи не объединяет)"""
+    name = normalize_name(company.text)
+    keys = ['url:' + normalize_url(company.url)]
+    keys.extend('phone:' + phone for phone in normalize_phones(company.phone))
+    keys.extend(email_keys(company.email, name))
+    site = _split_site(company.site)
+    if site:
+        host, path = site
+        if is_shared_host(host):
+            # Страница компании в соцсети или на хостинге: vk.com/firm_a и vk.com/firm_b различаются
+            if path:
+                keys.append(f'site:{host}{path}')
+        elif name:
+            # Домен сайта и домен почты компании обычно совпадают
+            keys.append(f'domain:{host}:{name}')
+    return keys
+
+
+class _PendingDetails:
+    """Данные компании, которые сейчас загружает другой поток"""
+
+    def __init__(self):
+        self.ready = threading.Event()
+        self.details = None
+
+
+class CompanyIndex:
+    """Индекс компаний за запуск
+
+    Хранит уже загруженные данные страниц компаний (одна загрузка на страницу
+    за весь запуск, даже если компания участвует в нескольких выставках) и
+    объединяет записи выставок в уникальные компании по identity_keys
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.details_by_url = {}
+        self.reused = 0
+        # Объединение записей по общим ключам (система непересекающихся множеств)
+        self.key_owner = {}
+        self.parent = []
+        self.companies = {}
+        # Страницы компаний записи по выставкам: {корень: {выставка: {url, ...}}}
+        self.exhibition_urls = {}
+
+    def fetch_once(self, url, fetch):
+        """Данные компании по url: из индекса или через fetch(url), если страницу еще не загружали
+
+        Одновременные запросы одной страницы из разных выставок ждут первую загрузку.
+        Результат None (временная ошибка загрузки) не запоминается, следующая выставка
+        попробует снова; {} (данных на странице нет) запоминается
+        """
+        key = normalize_url(url)
+        with self.lock:
+            entry = self.details_by_url.get(key)
+            owner = entry is None
+            if owner:
+                entry = self.details_by_url[key] = _PendingDetails()
+            else:
+                self.reused += 1
+        if not owner:
+            entry.ready.wait()
+            return entry.details
+        try:
+            entry.details = fetch(url)
+        finally:
+            if entry.details is None:
+                with self.lock:
+                    del self.details_by_url[key]
+            entry.ready.set()
+        return entry.details
+
+    def _remember(self, url, details):
+        """Данные компании, уже полученные раньше (без загрузки страницы); None - не получены"""
+        if details is None:
+            return
+        entry = _PendingDetails()
+        entry.details = details
+        entry.ready.set()
+        self.details_by_url.setdefault(normalize_url(url), entry)
+
+    def _find(self, node):
+        while self.parent[node] != node:
+            self.parent[node] = self.parent[self.parent[node]]
+            node = self.parent[node]
+        return node
+
+    @staticmethod
+    def _conflicts(first, second):
+        """Записи с разными страницами компаний в одной выставке - разные компании"""
+        return any(urls.isdisjoint(second[name]) for name, urls in first.items() if name in second)
+
+    def add_exhibition(self, exhibition, companies):
+        """Запись компаний выставки (Company): объединение с уже известными компаниями по общим ключам
+
+        Записи не объединяются, если в одной выставке у них разные страницы компаний:
+        такие строки одной таблицы - разные компании, даже при общем телефоне или домене.
+        Запись с той же страницей компании объединяется всегда
+        """
+        with self.lock:
+            for company in companies:
+                keys = identity_keys(company)
+                details = company.details
+                self._remember(company.url, None if company.failed else details)
+                own_urls = {exhibition['text']: {normalize_url(company.url)}}
+                root = None
+                # Корни по порядку ключей: сначала запись с той же страницей компании
+                for key in keys:
+                    if key not in self.key_owner:
+                        continue
+                    other = self._find(self.key_owner[key])
+                    same_page = key.startswith('url:')
+                    if other == root or (not same_page and self._conflicts(own_urls, self.exhibition_urls[other])):
+                        continue
+                    if root is None:
+                        root = other
+                    elif not self._conflicts(self.exhibition_urls[root], self.exhibition_urls[other]):
+                        if other < root:
+                            root, other = other, root
+                        self.parent[other] = root
+                        self._merge_urls(self.exhibition_urls[root], self.exhibition_urls.pop(other))
+                        self._merge(self.companies[root], self.companies.pop(other))
+                if root is None:
+                    root = len(self.parent)
+                    self.parent.append(root)
+                    self.exhibition_urls[root] = {}
+                    self.companies[root] = {'text': company.text, 'names': [], 'urls': [], 'exhibitions': [],
+                                            'details': {}}
+                for key in keys:
+                    self.key_owner.setdefault(key, root)
+                self._merge_urls(self.exhibition_urls[root], own_urls)
+                self._merge(self.companies[root], {
+                    'names': [company.text],
+                    'urls': [company.url],
+                    'exhibitions': [exhibition['text']],
+                    'details': details
+                })
+
+    @staticmethod
+    def _merge_urls(target, source):
+        for name, urls in source.items():
+            target.setdefault(name, set()).update(urls)
+
+    @staticmethod
+    def _merge(target, source):
+        # Все названия компании, первое - основное (text)
+        for field in ('names', 'urls', 'exhibitions'):
+            for value in source[field]:
+                if value not in target[field]:
+                    target[field].append(value)
+        # Пустые поля дополняются данными других записей той же компании
+        for field, value in source['details'].items():
+            if value and not target['details'].get(field):
+                target['details'][field] = value
+
+    def unique_count(self):
+        with self.lock:
+            return len(self.companies)
+
+    def write_master(self, path=MASTER_PATH):
+        """Запись уникальных компаний в JSONL (обычный или .gz): одна строка на компанию"""
+        with self.lock:
+            companies = [self.companies[root] for root in sorted(self.companies)]
+        with open_jsonl(path, 'wt') as f:
+            for company in companies:
+                f.write(json.dumps(company, ensure_ascii=False))
+                f.write('\n')
+        return len(companies)
@@ -0,0 +1,188 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+# Файл колоночного хранилища компаний выставок
+STORE_PATH = 'companies_store.sqlite'
+
+# Поля страницы компании (ключи details) и атрибуты Company
+DETAIL_FIELDS = (('Рубрика', 'rubric'), ('Телефон', 'phone'), ('E-mail', 'email'), ('Сайт', 'site'))
+# Колонки хранилища - атрибуты Company
+STORE_COLUMNS = ('text', 'url', 'rubric', 'phone', 'email', 'site')
+# Допуск при сравнении времени изменения Excel файла со временем записи выставки, секунд
+# (время файла на некоторых файловых системах округляется)
+MTIME_TOLERANCE = 2.0
+
+
+class Company:
+    """Компания выставки: название, страница компании и ее поля
+
+    Компактная запись (__slots__) вместо словаря {'text', 'url', 'details': {...}}.
+    Поле, которого не было на странице компании, равно None; details возвращает
+    словарь полей в прежнем виде (журнал обхода и JSONL). failed - страницу компании
+    не удалось загрузить из-за временной ошибки, ее нужно загрузить повторно
+    (в отличие от страницы, на которой данных нет)
+    """
+
+    __slots__ = STORE_COLUMNS + ('failed',)
+
+    def __init__(self, text, url, rubric=None, phone=None, email=None, site=None, failed=False):
+        self.text = text
+        self.url = url
+        self.rubric = rubric
+        self.phone = phone
+        self.email = email
+        self.site = site
+        self.failed = failed
+
+    @classmethod
+    def from_details(cls, text, url, details):
+        """Запись по словарю полей страницы компании: {} - данных на странице нет,
+        None - страница не загружена (временная ошибка)"""
+        if details is None:
+            return cls(text, url, failed=True)
+        return cls(text, url, *(details.get(key) for key, _ in DETAIL_FIELDS))
+
+    @property
+    def details(self):
+        return {key: getattr(self, attr) for key, attr in DETAIL_FIELDS if getattr(self, attr) is not None}
+
+    def row(self):
+        """Значения строки Excel: Название, Рубрика, Телефоны, Email, Сайт"""
+        return (self.text, self.rubric or '', self.phone or '', self.email or '', self.site or '')
+
+    def __eq__(self, other):
+        if not isinstance(other, Company):
+            return NotImplemented
+        return all(getattr(self, attr) == getattr(other, attr) for attr in STORE_COLUMNS)
+
+    def __repr__(self):
+        return f'Company({self.text!r}, {self.url!r}, details={self.details!r})'
+
+
+def encode_column(values):
+    return zlib.compress(json.dumps(values, ensure_ascii=False).encode('utf-8'))
+
+
+def decode_column(data):
+    return json.loads(zlib.decompress(data))
+
+
+class CompanyStore:
+    """Колоночное хранилище компаний выставок (SQLite)
+
+    Каждая колонка выставки (STORE_COLUMNS) хранится одним сжатым блоком, поэтому
+    анализ и демо-версии читают только нужные колонки без разбора Excel файлов.
+    Парсер записывает выставку один раз, после ее Excel файла (filename); данные
+    выставки совпадают с файлом, пока он есть и не изменен позже записи (matching_exhibitions)
+    """
+
+    def __init__(self, path=STORE_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS exhibitions (
+                name TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                written_at REAL NOT NULL
+            )
+        ''')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS columns (
+                exhibition TEXT NOT NULL,
+                name TEXT NOT NULL,
+                data BLOB NOT NULL,
+                PRIMARY KEY (exhibition, name)
+            )
+        ''')
+        self.db.commit()
+
+    def write_exhibition(self, exhibition, companies, filename):
+        """Запись (замена) всех компаний выставки"""
+        columns = {name: [] for name in STORE_COLUMNS}
+        for company in companies:
+            for name in STORE_COLUMNS:
+                columns[name].append(getattr(company, name))
+        with self.lock:
+            self.db.execute('DELETE FROM columns WHERE exhibition = ?', (exhibition['text'],))
+            self.db.executemany(
+                'INSERT INTO columns (exhibition, name, data) VALUES (?, ?, ?)',
+                [(exhibition['text'], name, encode_column(values)) for name, values in columns.items()]
+            )
+            self.db.execute(
+                'INSERT OR REPLACE INTO exhibitions (name, url, filename, row_count, written_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (exhibition['text'], exhibition['url'], filename, len(columns['text']), time.time())
+            )
+            self.db.commit()
+
+    def reset(self):
+        """Очистка хранилища (новый обход без --resume и --incremental)"""
+        with self.lock:
+            self.db.execute('DELETE FROM columns')
+            self.db.execute('DELETE FROM exhibitions')
+            self.db.commit()
+
+    def exhibitions(self):
+        """Выставки хранилища: [{'name', 'url', 'filename', 'rows', 'written_at'}] по названию"""
+        with self.lock:
+            rows = self.db.execute(
+                'SELECT name, url, filename, row_count, written_at FROM exhibitions ORDER BY name'
+            ).fetchall()
+        return [{'name': name, 'url': url, 'filename': filename, 'rows': count, 'written_at': written_at}
+                for name, url, filename, count, written_at in rows]
+
+    def matching_exhibitions(self, file_paths):
+        """Выставки хранилища для Excel файлов file_paths
+
+        Выставки, Excel файлов которых больше нет, не возвращаются. Если хотя бы один файл
+        не записан в хранилище или изменен после записи выставки, хранилище расходится
+        с файлами и возвращается None - данные нужно читать из Excel файлов
+        """
+        by_path = {os.path.abspath(exhibition['filename']): exhibition for exhibition in self.exhibitions()}
+        matching = []
+        for path in file_paths:
+            exhibition = by_path.get(os.path.abspath(path))
+            if exhibition is None or os.path.getmtime(path) > exhibition['written_at'] + MTIME_TOLERANCE:
+                return None
+            matching.append(exhibition)
+        return matching
+
+    def read_columns(self, exhibition_name, names=STORE_COLUMNS):
+        """Колонки выставки: {колонка: список значений}"""
+        with self.lock:
+            rows = self.db.execute(
+                f"SELECT name, data FROM columns WHERE exhibition = ? AND name IN ({', '.join('?' * len(names))})",
+                (exhibition_name, *names)
+            ).fetchall()
+        columns = {name: decode_column(data) for name, data in rows}
+        return {name: columns.get(name, []) for name in names}
+
+    def iter_companies(self, exhibition_name):
+        """Компании выставки в порядке Excel файла"""
+        columns = self.read_columns(exhibition_name)
+        return map(Company, *(columns[name] for name in STORE_COLUMNS))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def workbook_exhibitions(path, file_paths):
+    """Выставки хранилища path для Excel файлов file_paths (см. matching_exhibitions);
+    None, если хранилища нет или оно расходится с файлами"""
+    if not os.path.exists(path):
+        return None
+    with CompanyStore(path) as store:
+        return store.matching_exhibitions(file_paths)
@@ -0,0 +1,159 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from company_store import Company
+
+# Файл журнала обхода сайта
+JOURNAL_PATH = 'crawl_state.sqlite'
+
+
+def exhibitor_digest(companies):
+    """Отпечаток списка участников выставки: не зависит от порядка строк таблицы,
+    меняется при добавлении, удалении или переименовании компании"""
+    digest = hashlib.sha1()
+    for text, url in sorted((company.text, company.url) for company in companies):
+        digest.update(f'{url}\t{text}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class CrawlJournal:
+    """Журнал обхода: каждая компания и выставка записываются сразу после обработки,
+    чтобы прерванный запуск можно было продолжить (--resume)"""
+
+    def __init__(self, path=JOURNAL_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS exhibitions (
+                url TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                company_count INTEGER NOT NULL,
+                finished_at REAL NOT NULL,
+                list_digest TEXT
+            )
+        ''')
+        # Журнал прежней версии без отпечатка списка участников
+        columns = [row[1] for row in self.db.execute('PRAGMA table_info(exhibitions)')]
+        if 'list_digest' not in columns:
+            self.db.execute('ALTER TABLE exhibitions ADD COLUMN list_digest TEXT')
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS companies (
+                exhibition_url TEXT NOT NULL,
+                url TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                details TEXT NOT NULL,
+                PRIMARY KEY (exhibition_url, url)
+            )
+        ''')
+        self.db.commit()
+
+    def reset(self):
+        """Очистка журнала перед новым полным обходом"""
+        with self.lock:
+            self.db.execute('DELETE FROM companies')
+            self.db.execute('DELETE FROM exhibitions')
+            self.db.commit()
+
+    def company_done(self, exhibition_url, position, company):
+        """Запись обработанной компании выставки (Company)
+
+        Данные компании, которую не удалось загрузить (failed), записываются как null
+        и загружаются повторно; {} - страница загружена, но данных на ней нет
+        """
+        with self.lock:
+            self.db.execute(
+                'INSERT OR REPLACE INTO companies (exhibition_url, url, position, text, details) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (exhibition_url, company.url, position, company.text,
+                 json.dumps(None if company.failed else company.details, ensure_ascii=False))
+            )
+            self.db.commit()
+
+    def known_details(self, exhibition_url):
+        """Уже полученные данные компаний выставки, в том числе пустые: {url компании: details}"""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT url, details FROM companies WHERE exhibition_url = ? AND details != 'null'",
+                (exhibition_url,)
+            ).fetchall()
+        return {url: json.loads(details) for url, details in rows}
+
+    def exhibition_done(self, exhibition, companies):
+        """Выставка полностью обработана и ее Excel файл записан
+
+        Сохраняется отпечаток списка участников для сравнения со следующим запуском,
+        компании, которых больше нет в списке выставки, удаляются из журнала
+        """
+        urls = {company.url for company in companies}
+        with self.lock:
+            stored = self.db.execute(
+                'SELECT url FROM companies WHERE exhibition_url = ?', (exhibition['url'],)
+            ).fetchall()
+            self.db.executemany(
+                'DELETE FROM companies WHERE exhibition_url = ? AND url = ?',
+                [(exhibition['url'], url) for url, in stored if url not in urls]
+            )
+            self.db.execute(
+                'INSERT OR REPLACE INTO exhibitions (url, name, company_count, finished_at, list_digest) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (exhibition['url'], exhibition['text'], len(companies), time.time(),
+                 exhibitor_digest(companies))
+            )
+            self.db.commit()
+
+    def exhibition_state(self, exhibition_url):
+        """Название и отпечаток списка участников выставки на момент ее обработки; None,
+        если выставка еще не обработана"""
+        with self.lock:
+            row = self.db.execute(
+                'SELECT name, list_digest FROM exhibitions WHERE url = ?', (exhibition_url,)
+            ).fetchone()
+        return {'text': row[0], 'list_digest': row[1]} if row else None
+
+    def reopen_exhibition(self, exhibition_url):
+        """Выставка снова считается необработанной (список участников изменился);
+        уже полученные данные компаний остаются в журнале"""
+        with self.lock:
+            self.db.execute('DELETE FROM exhibitions WHERE url = ?', (exhibition_url,))
+            self.db.commit()
+
+    def is_exhibition_done(self, exhibition_url):
+        with self.lock:
+            row = self.db.execute('SELECT 1 FROM exhibitions WHERE url = ?', (exhibition_url,)).fetchone()
+        return row is not None
+
+    def done_exhibitions(self):
+        """Полностью обработанные выставки: [{'text': название, 'url': url}]"""
+        with self.lock:
+            rows = self.db.execute('SELECT name, url FROM exhibitions ORDER BY finished_at').fetchall()
+        return [{'text': name, 'url': url} for name, url in rows]
+
+    def count_companies(self):
+        with self.lock:
+            return self.db.execute('SELECT COUNT(*) FROM companies').fetchone()[0]
+
+    def iter_companies(self, exhibition_url):
+        """Компании выставки (Company) в порядке таблицы, без загрузки всего журнала в память"""
+        with self.lock:
+            cursor = self.db.cursor()
+            cursor.execute(
+                'SELECT text, url, details FROM companies WHERE exhibition_url = ? ORDER BY position',
+                (exhibition_url,)
+            )
+        while True:
+            with self.lock:
+                rows = cursor.fetchmany(500)
+            if not rows:
+                break
+            for text, url, details in rows:
+                yield Company.from_details(text, url, json.loads(details))
+
+    def close(self):
+        with self.lock:
+            self.db.close()
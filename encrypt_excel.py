@@ -1,14 +1,26 @@
-import pandas as pd
-from openpyxl import load_workbook
-from openpyxl.styles import Font, Alignment, PatternFill
+import argparse
 import os
+from concurrent.futures import ProcessPoolExecutor
+from openpyxl import load_workbook
+from openpyxl.styles import Font, Alignment
+from company_store import CompanyStore, STORE_PATH, workbook_exhibitions
+from excel_writer import COLUMN_TITLES, DEMO_DIR, HEADER_ROW_COUNT, StreamingExcelWriter, demo_filename, load_demo_mask
+
+# Number of worker processes (None - one per CPU core)
+DEMO_WORKERS = None
 
-def encrypt_excel_file(input_file):
+def demo_output_path(input_file):
+    os.makedirs(DEMO_DIR, exist_ok=True)
+    return demo_filename(input_file)
+
+def encrypt_excel_file(input_file, mask=None):
     """
     Encrypt Excel file content after first 5 company rows (9 rows total including header)
     Keep 'Название' and 'Рубрика' columns unencrypted
+    (defaults of the 'demo' section in excel_template.json, see load_demo_mask)
     """
     print(f"Обработка файла: {os.path.basename(input_file)}")
+    mask = mask or load_demo_mask()
     
     # Load the workbook
     wb = load_workbook(input_file)
@@ -18,61 +30,169 @@ def encrypt_excel_file(input_file):
     last_row = ws.max_row
     
     # Get column indices for 'Название' and 'Рубрика' (they are in columns A and B)
-    unencrypted_columns = [1, 2]  # A and B columns
+    unencrypted_columns = mask.kept_columns
     
     # Starting from row 10 (after 4 header rows + 5 company rows)
-    for row in range(10, last_row + 1):
+    for row in range(HEADER_ROW_COUNT + mask.visible_rows + 1, last_row + 1):
         # Process all columns
         for col in range(1, ws.max_column + 1):
             # Skip 'Название' and 'Рубрика' columns
             if col not in unencrypted_columns:
                 cell = ws.cell(row=row, column=col)
                 if cell.value:
-                    # Replace any value with exactly 4 X's
-                    cell.value = 'XXXX'
+                    # Replace any value with the mask token (exactly 4 X's by default)
+                    cell.value = mask.token
                     
                     # Preserve the font and alignment
                     cell.font = Font(name='Times New Roman')
                     cell.alignment = Alignment(horizontal='left')
     
-    # Create 'демо_версии' directory if it doesn't exist
-    os.makedirs('демо_версии', exist_ok=True)
-    
-    # Generate output filename
-    file_name = os.path.basename(input_file)
-    output_file = os.path.join('демо_версии', f'демо_версия_{file_name}')
+    # Generate output filename ('демо_версии' directory is created if it doesn't exist)
+    output_file = demo_output_path(input_file)
     
     # Save the modified workbook
     wb.save(output_file)
     print(f"Создан файл: {output_file}")
 
+def stream_demo_file(input_file, mask=None):
+    """
+    Streaming demo version of a workbook written by the parser (same layout as save_to_excel):
+    rows are read in read-only mode and written in write-only mode with shared styles,
+    so memory use doesn't depend on the file size. Masking rules are the same as in
+    encrypt_excel_file
+    """
+    print(f"Обработка файла: {os.path.basename(input_file)}")
+    output_file = demo_output_path(input_file)
+    
+    wb = load_workbook(input_file, read_only=True, data_only=True)
+    try:
+        rows = wb.active.iter_rows(values_only=True)
+        # Header texts are taken from the source file, styles from the header template
+        header = [row for _, row in zip(range(HEADER_ROW_COUNT), rows)]
+        with StreamingExcelWriter(output_file, mask=mask or load_demo_mask(), header_values=header) as writer:
+            for row in rows:
+                # Every data column is written, empty ones included, so empty trailing
+                # cells keep the data style as in the parser's files; cells past the data
+                # columns are written only if they have values
+                values = list(row)
+                while len(values) > len(COLUMN_TITLES) and values[-1] is None:
+                    values.pop()
+                values.extend([None] * (len(COLUMN_TITLES) - len(values)))
+                writer.write_row(values)
+    finally:
+        wb.close()
+    
+    print(f"Создан файл: {output_file}")
+    return output_file
+
+def store_demo_task(task):
+    """
+    Worker task: demo version of one exhibition straight from the parser's company store,
+    no workbook is read. Header texts and styles come from the header template,
+    as in the demo versions written by parser.py. Returns (file, error)
+    """
+    store_path, exhibition, mask = task
+    try:
+        print(f"Обработка выставки: {exhibition['name']}")
+        output_file = demo_output_path(exhibition['filename'])
+        with CompanyStore(store_path) as store, StreamingExcelWriter(output_file, mask=mask) as writer:
+            writer.write_companies(store.iter_companies(exhibition['name']))
+        print(f"Создан файл: {output_file}")
+        return exhibition['filename'], None
+    except Exception as e:
+        return exhibition['filename'], e
+
+def create_demo_versions_from_store(store_path=STORE_PATH, workers=DEMO_WORKERS, mask=None, exhibitions=None):
+    """Demo versions of the store's exhibitions in a process pool; returns [(file, error)].
+
+    exhibitions - store entries to process (see workbook_exhibitions), default all of them.
+    """
+    mask = mask or load_demo_mask()
+    if exhibitions is None:
+        with CompanyStore(store_path) as store:
+            exhibitions = store.exhibitions()
+    tasks = [(store_path, exhibition, mask) for exhibition in exhibitions]
+    if workers == 1 or len(tasks) < 2:
+        return list(map(store_demo_task, tasks))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(store_demo_task, tasks))
+
+def demo_task(task):
+    """Worker task: (file, error) so one broken file doesn't stop the pool."""
+    input_file, streaming, mask = task
+    try:
+        if streaming:
+            stream_demo_file(input_file, mask)
+        else:
+            encrypt_excel_file(input_file, mask)
+        return input_file, None
+    except Exception as e:
+        return input_file, e
+
+def create_demo_versions(input_files, workers=DEMO_WORKERS, streaming=True, mask=None):
+    """Demo versions of all files in a process pool; returns [(file, error)] in input order."""
+    mask = mask or load_demo_mask()
+    tasks = [(input_file, streaming, mask) for input_file in input_files]
+    if workers == 1 or len(tasks) < 2:
+        return list(map(demo_task, tasks))
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(demo_task, tasks))
+
 def main():
+    arg_parser = argparse.ArgumentParser(description='Demo versions of the exhibition Excel files')
+    arg_parser.add_argument('--workers', type=int, default=DEMO_WORKERS,
+                            help='number of worker processes (default: one per CPU core, 1 - no pool)')
+    arg_parser.add_argument('--in-memory', action='store_true',
+                            help='load whole workbooks and keep their own styles (for files not written by parser.py)')
+    arg_parser.add_argument('--store', default=STORE_PATH,
+                            help='company store written by parser.py (default: %(default)s)')
+    arg_parser.add_argument('--from-excel', action='store_true',
+                            help='read the Excel files even if the company store exists')
+    args = arg_parser.parse_args()
+    
     # Get list of Excel files in the excel directory
     excel_dir = 'excel'
     if not os.path.exists(excel_dir):
         print("Папка 'excel' не найдена!")
         return
         
-    excel_files = [f for f in os.listdir(excel_dir) if f.endswith('.xlsx')]
+    # Only exhibition files, not the analysis reports in the same folder
+    excel_files = [f for f in os.listdir(excel_dir) if 'участники выставки' in f and f.endswith('.xlsx')]
     
     if not excel_files:
         print("Excel файлы не найдены в папке 'excel'!")
         return
+    input_files = [os.path.join(excel_dir, file) for file in excel_files]
+    
+    # The parser's store has the same rows in columns, demo versions are written without reading Excel,
+    # as long as it has every file of the folder and none was changed after the parser wrote it
+    use_store = not args.from_excel and not args.in_memory
+    exhibitions = workbook_exhibitions(args.store, input_files) if use_store else None
+    if exhibitions is not None:
+        print(f"Демо-версии по данным хранилища: {args.store}")
+        print("Колонки 'Название' и 'Рубрика' останутся без изменений, остальные данные будут зашифрованы")
+        processed = create_demo_versions_from_store(args.store, args.workers, exhibitions=exhibitions)
+        for input_file, error in processed:
+            if error is not None:
+                print(f"Ошибка при обработке выставки {os.path.basename(input_file)}: {error}")
+        print("\nОбработка завершена!")
+        print(f"Обработано выставок: {len(processed)}")
+        print(f"Зашифрованные файлы сохранены в папку '{DEMO_DIR}'")
+        return
+    if use_store and os.path.exists(args.store):
+        print(f"Хранилище {args.store} не совпадает с файлами в папке 'excel', читаем файлы")
     
     print(f"Найдено файлов для обработки: {len(excel_files)}")
     print("Колонки 'Название' и 'Рубрика' останутся без изменений, остальные данные будут зашифрованы")
     
-    # Process all files
-    for file in excel_files:
-        try:
-            input_file = os.path.join(excel_dir, file)
-            encrypt_excel_file(input_file)
-        except Exception as e:
-            print(f"Ошибка при обработке файла {file}: {e}")
+    # Process all files in parallel
+    for input_file, error in create_demo_versions(input_files, args.workers, streaming=not args.in_memory):
+        if error is not None:
+            print(f"Ошибка при обработке файла {os.path.basename(input_file)}: {error}")
     
     print("\nОбработка завершена!")
     print(f"Обработано файлов: {len(excel_files)}")
-    print("Зашифрованные файлы сохранены в папку 'демо_версии'")
+    print(f"Зашифрованные файлы сохранены в папку '{DEMO_DIR}'")
 
 if __name__ == '__main__':
     main() 
\ No newline at end of file
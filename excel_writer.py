@@ -0,0 +1,270 @@
+import json
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.drawing.image import Image
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+from openpyxl.utils import column_index_from_string
+
+# Папка с Excel файлами выставок
+EXCEL_DIR = 'excel'
+# Папка с демо-версиями Excel файлов
+DEMO_DIR = 'демо_версии'
+# Название листа в файлах выставок
+SHEET_TITLE = 'Аитэра 7495 223 35 57'
+# Логотип в левом верхнем углу листа
+LOGO_PATH = 'Рисунок1.jpg'
+
+# Файл с настройками шапки листа (контакты, цены, сезон обновления)
+TEMPLATE_PATH = 'excel_template.json'
+
+# Значения шапки по умолчанию, если файла настроек нет или в нем нет поля
+TEMPLATE_DEFAULTS = {
+    'title': 'базы данных предприятий России',
+    'site': 'www.базы-предприятий.рф',
+    'email': 'helper@aitera.com',
+    'phone': '8495 223 35 57',
+    'sms_price': '2,99 р. / сообщение',
+    'email_price': '3 р. 99 коп. / письмо',
+    'calls_price': '17 990 р. / 500 диалогов',
+    'advert': 'Здесь может быть Ваша реклама',
+    'update_season': 'февраль и сентябрь',
+    'logo': LOGO_PATH,
+    # Правила демо-версии: сколько первых компаний видно полностью,
+    # какие колонки не шифруются и чем заменяются остальные значения
+    'demo': {
+        'visible_rows': 5,
+        'kept_columns': ['A', 'B'],
+        'token': 'XXXX'
+    }
+}
+
+# Названия колонок данных (4-я строка шапки)
+COLUMN_TITLES = ["Название", "Рубрика", "Телефоны", "Email", "Сайт"]
+# Число строк шапки, данные компаний начинаются со следующей строки
+HEADER_ROW_COUNT = 4
+# Объединенные ячейки шапки
+HEADER_MERGES = ['A1:A3', 'C1:D1', 'E1:F2']
+# Высота строк шапки (30 пикселей ≈ 22.5 пунктов)
+HEADER_ROW_HEIGHT = 22.5
+
+COLUMN_WIDTHS = {
+    'A': 35, 'B': 25, 'C': 20,
+    'D': 20, 'E': 10, 'F': 35,
+    'G': 35, 'H': 25, 'I': 25, 'J': 30
+}
+
+
+def header_rows(config):
+    """Строки шапки листа: 3 строки с контактами и строка с названиями колонок"""
+    return [
+        [config['title'], config['site'], f"SMS рассылка: {config['sms_price']}", "",
+         config['advert'], "", "", f"Обновляется {config['update_season']}", "", ""],
+        ["", config['email'], f"E-mail адресная рассылка: {config['email_price']}", "", "", "", "", "", "", ""],
+        ["", f"\nтелефон: {config['phone']}", f"Холодные звонки: {config['calls_price']}", "", "", "", "", "", "", ""],
+        list(COLUMN_TITLES)
+    ]
+
+
+def header_style(row_idx, col_idx):
+    """Имя стиля ячейки шапки"""
+    if row_idx == 4:
+        return 'expo_header'  # Жирный Times New Roman для заголовков
+    if row_idx == 1 and col_idx == 3:  # SMS рассылка
+        return 'expo_top_center'
+    if row_idx == 1 and col_idx == 5:  # Здесь может быть Ваша реклама
+        return 'expo_advert'
+    return 'expo_top'
+
+
+class HeaderTemplate:
+    """Заранее подготовленная шапка листа: тексты ячеек с их стилями,
+    шрифты и заливки, байты логотипа
+
+    Строится один раз за запуск (см. load_header_template), каждая книга
+    получает шапку через stamp без повторного чтения логотипа с диска
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.rows = [
+            [(value, header_style(row_idx, col_idx)) for col_idx, value in enumerate(row_data, 1)]
+            for row_idx, row_data in enumerate(header_rows(config), 1)
+        ]
+        with open(config['logo'], 'rb') as f:
+            self.logo_bytes = f.read()
+
+        # Шрифты, заливки и выравнивания общие для всех книг запуска
+        calibri_bold = Font(name='Calibri', bold=True)
+        center = Alignment(horizontal='center', vertical='center')
+        self.style_parts = [
+            ('expo_top', {'font': calibri_bold}),
+            ('expo_top_center', {'font': calibri_bold, 'alignment': center}),
+            ('expo_advert', {'font': Font(name='Calibri', bold=True, color='1F497D', size=16),
+                             'alignment': center}),
+            ('expo_header', {'font': Font(name='Times New Roman', bold=True),
+                             'alignment': Alignment(horizontal='center'),
+                             'fill': PatternFill(start_color='C5D9F1', end_color='C5D9F1', fill_type='solid')}),
+            ('expo_data', {'font': Font(name='Times New Roman')}),
+            ('expo_masked', {'font': Font(name='Times New Roman'), 'alignment': Alignment(horizontal='left')}),
+        ]
+
+    def register_styles(self, workbook):
+        """Общие стили листа: ячейки ссылаются на них по имени, без своих Font на каждую ячейку"""
+        # Именованный стиль привязывается к одной книге, поэтому создается для каждой книги
+        for name, parts in self.style_parts:
+            workbook.add_named_style(NamedStyle(name, **parts))
+
+    def logo(self):
+        logo = Image(BytesIO(self.logo_bytes))
+        logo.width = 150
+        logo.height = 50
+        return logo
+
+    def stamp(self, worksheet, values=None):
+        """Шапка листа: первые 4 строки, логотип, объединения и закрепление строк
+
+        Лист должен быть пустым, а стили - зарегистрированы в его книге (register_styles);
+        подходит и для обычного листа, и для листа write-only.
+        values - тексты шапки вместо текстов шаблона (строки шапки исходного файла),
+        стили и размеры шапки остаются как в шаблоне
+        """
+        # Закрепляем первые 4 строки (в write-only режиме вид листа пишется до первой строки)
+        worksheet.freeze_panes = "A5"
+
+        for row in range(1, HEADER_ROW_COUNT + 1):
+            worksheet.row_dimensions[row].height = HEADER_ROW_HEIGHT
+
+        for row_idx, row in enumerate(self.rows):
+            cells = []
+            for col_idx, (value, style) in enumerate(row):
+                if values is not None:
+                    row_values = values[row_idx] if row_idx < len(values) else ()
+                    value = row_values[col_idx] if col_idx < len(row_values) else None
+                cell = WriteOnlyCell(worksheet, value=value)
+                cell.style = style
+                cells.append(cell)
+            worksheet.append(cells)
+
+        # Объединения записываются в конце листа, поэтому добавляем их как диапазоны
+        for cell_range in HEADER_MERGES:
+            worksheet.merged_cells.add(cell_range)
+
+        worksheet.add_image(self.logo(), 'A1')
+
+
+def read_template_config(path=TEMPLATE_PATH):
+    """Настройки шапки из JSON файла поверх значений по умолчанию"""
+    config = dict(TEMPLATE_DEFAULTS)
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            config.update(json.load(f))
+    return config
+
+
+@lru_cache(maxsize=None)
+def load_header_template(path=TEMPLATE_PATH):
+    """Шапка листа по файлу настроек; строится один раз на файл за запуск"""
+    return HeaderTemplate(read_template_config(path))
+
+
+def load_demo_mask(path=TEMPLATE_PATH):
+    """Правила демо-версии из раздела 'demo' файла настроек"""
+    settings = dict(TEMPLATE_DEFAULTS['demo'])
+    settings.update(read_template_config(path).get('demo') or {})
+    kept_columns = [
+        column_index_from_string(column) if isinstance(column, str) else column
+        for column in settings['kept_columns']
+    ]
+    return DemoMask(settings['visible_rows'], kept_columns, settings['token'])
+
+
+def exhibition_filename(exhibition_name, directory=EXCEL_DIR):
+    return os.path.join(directory, f'Аитэра +7495 223 35 57 участники выставки {exhibition_name}.xlsx')
+
+
+def demo_filename(filename, directory=DEMO_DIR):
+    """Файл демо-версии для Excel файла выставки"""
+    return os.path.join(directory, f'демо_версия_{os.path.basename(filename)}')
+
+
+class DemoMask:
+    """Правила демо-версии: первые visible_rows компаний видны полностью, в остальных
+    строках непустые значения всех колонок, кроме kept_columns, заменяются на token"""
+
+    def __init__(self, visible_rows=5, kept_columns=(1, 2), token='XXXX'):
+        self.visible_rows = visible_rows
+        # Колонки 'Название' и 'Рубрика' (A и B) не шифруются
+        self.kept_columns = frozenset(kept_columns)
+        self.token = token
+
+    def apply(self, position, values):
+        """Пары (значение, стиль) для строки компании с номером position (с 0)"""
+        if position < self.visible_rows:
+            return [(value, 'expo_data') for value in values]
+        return [
+            (self.token, 'expo_masked') if value and col_idx not in self.kept_columns else (value, 'expo_data')
+            for col_idx, value in enumerate(values, 1)
+        ]
+
+
+class StreamingExcelWriter:
+    """Потоковая запись Excel файла выставки (openpyxl write-only)
+
+    Строки компаний сразу уходят во временный файл на диске, поэтому
+    потребление памяти не зависит от числа компаний
+    """
+
+    def __init__(self, filename, template=None, mask=None, header_values=None):
+        """mask - правила демо-версии (DemoMask), строки компаний пишутся уже зашифрованными;
+        header_values - тексты шапки вместо текстов шаблона"""
+        self.filename = filename
+        self.template = template or load_header_template()
+        self.mask = mask
+        self.workbook = Workbook(write_only=True)
+        self.template.register_styles(self.workbook)
+        self.worksheet = self.workbook.create_sheet(SHEET_TITLE)
+        # Ширина колонок записывается в начало листа, задаем ее до первой строки
+        for col, width in COLUMN_WIDTHS.items():
+            self.worksheet.column_dimensions[col].width = width
+        self.template.stamp(self.worksheet, header_values)
+        self.count = 0
+
+    def write_row(self, values):
+        """Строка данных (значения колонок по порядку) под шапкой"""
+        if self.mask is not None:
+            styled = self.mask.apply(self.count, values)
+        else:
+            styled = [(value, 'expo_data') for value in values]  # Times New Roman для всех данных
+        cells = []
+        for value, style in styled:
+            cell = WriteOnlyCell(self.worksheet, value=value)
+            cell.style = style
+            cells.append(cell)
+        self.worksheet.append(cells)
+        self.count += 1
+
+    def write_company(self, company):
+        """Строка компании (Company)"""
+        self.write_row(company.row())
+
+    def write_companies(self, companies):
+        for company in companies:
+            self.write_company(company)
+
+    def close(self):
+        """Автофильтр по всем записанным строкам и сохранение файла"""
+        last_row = self.count + HEADER_ROW_COUNT
+        self.worksheet.auto_filter.ref = f"A4:E{last_row}"
+        self.workbook.save(self.filename)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Файл сохраняется только при успешной записи всех строк
+        if exc_type is None:
+            self.close()
@@ -0,0 +1,98 @@
+import json
+import os
+import re
+from urllib.parse import urljoin, urlsplit
+
+from company_index import normalize_url
+
+# Файл с настройками выбора выставок
+SELECTION_PATH = 'exhibitions.json'
+# Годы в названии выставки, если выбор не настроен
+DEFAULT_YEARS = ['2024', '2025']
+
+
+def exhibition_url(url):
+    """Адрес выставки без окончания /list (список компаний открывается по адресу + /list)"""
+    url = url.strip().rstrip('/')
+    return url[:-len('/list')] if url.endswith('/list') else url
+
+
+def name_from_url(url):
+    """Название для выставки, которой нет на главной странице: последняя часть адреса"""
+    return urlsplit(url).path.rstrip('/').rsplit('/', 1)[-1] or url
+
+
+class ExhibitionSelection:
+    """Выбор выставок для обработки
+
+    Выставка с главной страницы каталога выбирается, если в ее названии есть один
+    из годов years и название подходит под один из шаблонов patterns (регулярные
+    выражения без учета регистра); пустой список - без ограничения. Выставки из urls
+    (адрес или {"url": адрес, "name": название}) добавляются всегда. Если задан только
+    список адресов, выставки главной страницы не выбираются
+    """
+
+    def __init__(self, years=None, patterns=None, urls=None):
+        urls = urls or []
+        if years is None and patterns is None and not urls:
+            years = DEFAULT_YEARS
+        self.from_catalogue = years is not None or patterns is not None
+        self.years = [str(year) for year in years or []]
+        self.patterns = [re.compile(pattern, re.IGNORECASE) for pattern in patterns or []]
+        self.urls = [
+            {'url': entry, 'name': None} if isinstance(entry, str)
+            else {'url': entry['url'], 'name': entry.get('name')}
+            for entry in urls
+        ]
+
+    def matches(self, name):
+        if not self.from_catalogue:
+            return False
+        if self.years and not any(year in name for year in self.years):
+            return False
+        return not self.patterns or any(pattern.search(name) for pattern in self.patterns)
+
+    def select(self, catalogue, base_url):
+        """Выбранные выставки [{'text', 'url'}] из выставок главной страницы catalogue
+        и явно заданных адресов (относительные адреса - от base_url)"""
+        selected = [exhibition for exhibition in catalogue if self.matches(exhibition['text'])]
+        by_url = {normalize_url(exhibition['url']): exhibition for exhibition in catalogue}
+        seen = {normalize_url(exhibition['url']) for exhibition in selected}
+        for entry in self.urls:
+            full_url = exhibition_url(urljoin(base_url, entry['url']))
+            key = normalize_url(full_url)
+            if key in seen:
+                continue
+            seen.add(key)
+            known = by_url.get(key)
+            selected.append({
+                'text': entry['name'] or (known['text'] if known else name_from_url(full_url)),
+                'url': known['url'] if known else full_url
+            })
+        return selected
+
+    def describe(self):
+        parts = []
+        if self.from_catalogue:
+            parts.append(f"годы: {', '.join(self.years)}" if self.years else 'все годы')
+            if self.patterns:
+                parts.append(f"шаблоны: {', '.join(pattern.pattern for pattern in self.patterns)}")
+        if self.urls:
+            parts.append(f"адресов: {len(self.urls)}")
+        return '; '.join(parts)
+
+
+def load_selection(path=SELECTION_PATH, years=None, patterns=None, urls=None):
+    """Выбор выставок из JSON файла (поля years, patterns, urls) с параметрами командной
+    строки поверх него; адреса из командной строки без годов и шаблонов заменяют выбор целиком"""
+    if urls and years is None and patterns is None:
+        return ExhibitionSelection(urls=urls)
+    config = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            config = json.load(f)
+    return ExhibitionSelection(
+        years if years is not None else config.get('years'),
+        patterns if patterns is not None else config.get('patterns'),
+        urls if urls is not None else config.get('urls')
+    )
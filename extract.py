@@ -0,0 +1,393 @@
+import argparse
+import json
+import os
+import sqlite3
+from collections import deque
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+from bs4 import BeautifulSoup
+from lxml import etree
+
+from http_cache import CACHE_PATH
+
+# Теги, текст внутри которых BeautifulSoup не включает в get_text()
+# (строки внутри них имеют отдельные типы: Script, Stylesheet и т.д.)
+NON_TEXT_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])
+
+# Заранее скомпилированные XPath выражения
+DL_HORIZONTAL_XPATH = etree.XPath("//*[contains(@class, 'dl-horizontal')]")
+FRESH_TABLE_XPATH = etree.XPath("//*[@id='fresh-table']")
+DT_XPATH = etree.XPath('.//dt')
+DD_XPATH = etree.XPath('.//dd')
+TR_XPATH = etree.XPath('.//tr')
+FIRST_TD_XPATH = etree.XPath('(.//td)[1]')
+FIRST_A_XPATH = etree.XPath('(.//a)[1]')
+SPAN_XPATH = etree.XPath(".//span[contains(@class, 'label-primary')]")
+
+# Размер куска текста при проверке потокового разбора (verify_corpus)
+STREAM_CHECK_CHUNK = 4096
+# Сохраненные страницы компаний и списков для проверки разбора (verify_corpus)
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corpus')
+# Адреса страниц папки: {имя файла: url}
+CORPUS_URLS = 'urls.json'
+
+
+def parse_html(html):
+    """Дерево lxml для страницы (None для пустой страницы)"""
+    if not html.strip():
+        return None
+    try:
+        return etree.HTML(html)
+    except ValueError:
+        # Объявление кодировки внутри str не поддерживается, разбираем байты
+        return etree.HTML(html.encode('utf-8'), etree.HTMLParser(encoding='utf-8'))
+
+
+def class_tokens(element):
+    return (element.get('class') or '').split()
+
+
+def _collect_text(element, parts, skip):
+    if element.tag in NON_TEXT_TAGS:
+        skip = True
+    if not skip and element.text:
+        text = element.text.strip()
+        if text:
+            parts.append(text)
+    for child in element:
+        if isinstance(child.tag, str):
+            _collect_text(child, parts, skip)
+        # У комментариев учитывается только текст после них (tail)
+        if not skip and child.tail:
+            tail = child.tail.strip()
+            if tail:
+                parts.append(tail)
+
+
+def get_text(element):
+    """Аналог BeautifulSoup get_text(strip=True) для элемента lxml"""
+    skip = any(ancestor.tag in NON_TEXT_TAGS for ancestor in element.iterancestors())
+    parts = []
+    _collect_text(element, parts, skip)
+    return ''.join(parts)
+
+
+def first(xpath, element):
+    found = xpath(element)
+    return found[0] if found else None
+
+
+def extract_company_details(html):
+    """Данные компании из блока dl-horizontal; None, если блок не найден
+
+    Результат совпадает поле в поле с разбором через BeautifulSoup
+    (см. soup_company_details и verify_corpus)
+    """
+    root = parse_html(html)
+    if root is None:
+        return None
+    dl_horizontal = None
+    for element in DL_HORIZONTAL_XPATH(root):
+        if 'dl-horizontal' in class_tokens(element):
+            dl_horizontal = element
+            break
+    if dl_horizontal is None:
+        return None
+
+    company_info = {}
+    for dt, dd in zip(DT_XPATH(dl_horizontal), DD_XPATH(dl_horizontal)):
+        key = get_text(dt)
+
+        if key == "Сайт:":
+            site_link = first(FIRST_A_XPATH, dd)
+            company_info['Сайт'] = get_text(site_link) if site_link is not None else ''
+        elif key == "Телефон:":
+            company_info['Телефон'] = get_text(dd)
+        elif key == "E-mail:":
+            email_link = first(FIRST_A_XPATH, dd)
+            company_info['E-mail'] = get_text(email_link) if email_link is not None else ''
+
+        categories = [
+            get_text(span) for span in SPAN_XPATH(dd)
+            if class_tokens(span) == ['label', 'label-primary']
+        ]
+        company_info['Рубрика'] = '; '.join(categories)
+
+    return company_info
+
+
+def extract_table_links(html, url):
+    """Ссылки на компании из таблицы fresh-table: [(название, полный url)];
+    None, если таблица не найдена"""
+    root = parse_html(html)
+    if root is None:
+        return None
+    fresh_table = first(FRESH_TABLE_XPATH, root)
+    if fresh_table is None:
+        return None
+
+    company_links = []
+    for row in TR_XPATH(fresh_table):
+        first_td = first(FIRST_TD_XPATH, row)
+        if first_td is None:
+            continue
+        link = first(FIRST_A_XPATH, first_td)
+        if link is None:
+            continue
+        href = link.get('href', '')
+        full_url = urljoin(url, href) if href else ''
+        if full_url:
+            company_links.append((get_text(link), full_url))
+    return company_links
+
+
+def is_list_page(url, list_url):
+    """Страница той же таблицы компаний: тот же хост и путь /list
+    (страницы отличаются параметрами запроса или окончанием /list/N)"""
+    parts, list_parts = urlsplit(url), urlsplit(list_url)
+    path, list_path = parts.path.rstrip('/'), list_parts.path.rstrip('/')
+    return (parts.netloc == list_parts.netloc
+            and (path == list_path or path.startswith(list_path + '/')))
+
+
+def list_page_key(url):
+    """Ключ страницы списка для поиска повторов: без различий в регистре хоста,
+    завершающем / и порядке параметров; ?page=1 - та же страница, что и адрес без номера"""
+    parts = urlsplit(url)
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not (name == 'page' and value in ('', '1'))
+    )
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip('/'), urlencode(query), ''))
+
+
+class TableLinkParser:
+    """Потоковый разбор страницы /list: ссылки на компании из таблицы fresh-table
+    выдаются по мере разбора строк, не дожидаясь загрузки всей страницы
+
+    Ссылки всей страницы совпадают с extract_table_links. Попутно собираются
+    ссылки постраничной навигации на другие страницы той же таблицы (page_links):
+    ссылки с rel="next" и ссылки внутри элементов с классом pagination
+    """
+
+    def __init__(self, url):
+        self.url = url
+        self.parser = etree.HTMLPullParser(events=('start', 'end'))
+        self.table = None
+        self.page_links = []
+        self.pending = ''
+        # Начатые строки таблицы в порядке документа: [строка, вложенная, разобрана, ссылка].
+        # Вложенная строка заканчивается раньше внешней, поэтому ссылки выдаются
+        # только после разбора всех предыдущих строк
+        self.rows = deque()
+
+    @property
+    def table_found(self):
+        return self.table is not None
+
+    def feed(self, text):
+        """Очередной кусок страницы; ссылки из строк таблицы, разобранных полностью"""
+        text = self.pending + text
+        # Незаконченный тег откладывается до следующего куска: libxml2 в потоковом
+        # режиме неверно разбирает закрывающий </script>, разрезанный между кусками
+        cut = text.rfind('<')
+        if cut > text.rfind('>'):
+            text, self.pending = text[:cut], text[cut:]
+        else:
+            self.pending = ''
+        if text:
+            self.parser.feed(text)
+        return self._read_events()
+
+    def close(self):
+        """Конец страницы; ссылки из оставшихся строк таблицы"""
+        if self.pending:
+            self.parser.feed(self.pending)
+            self.pending = ''
+        try:
+            self.parser.close()
+        except etree.XMLSyntaxError:
+            # Пустая страница
+            pass
+        return self._read_events()
+
+    def _read_events(self):
+        company_links = []
+        for event, element in self.parser.read_events():
+            if event == 'start':
+                if self.table is None and element.get('id') == 'fresh-table':
+                    self.table = element
+                elif element.tag == 'tr' and self.table is not None:
+                    self._start_row(element)
+            elif element.tag == 'tr':
+                self._end_row(element)
+                while self.rows and self.rows[0][2]:
+                    link = self.rows.popleft()[3]
+                    if link is not None:
+                        company_links.append(link)
+            elif element.tag == 'a':
+                self._page_link(element)
+        return company_links
+
+    def _start_row(self, row):
+        nested = False
+        for ancestor in row.iterancestors():
+            if ancestor is self.table:
+                self.rows.append([row, nested, False, None])
+                return
+            if ancestor.tag == 'tr':
+                nested = True
+
+    def _end_row(self, row):
+        for entry in reversed(self.rows):
+            if entry[0] is row:
+                entry[2], entry[3] = True, self._row_link(row, entry[1])
+                return
+
+    def _row_link(self, row, nested):
+        first_td = first(FIRST_TD_XPATH, row)
+        link = first(FIRST_A_XPATH, first_td) if first_td is not None else None
+        href = link.get('href', '') if link is not None else ''
+        full_url = urljoin(self.url, href) if href else ''
+        result = (get_text(link), full_url) if full_url else None
+        if not nested:
+            # Разобранная строка больше не нужна, страница не накапливается в памяти
+            row.clear()
+        return result
+
+    def _page_link(self, link):
+        href = link.get('href', '')
+        if not href or href.startswith(('#', 'javascript:')):
+            return
+        if 'next' not in (link.get('rel') or '').split() and not any(
+                'pagination' in class_tokens(ancestor) for ancestor in link.iterancestors()):
+            return
+        page_url = urljoin(self.url, href).split('#', 1)[0]
+        if is_list_page(page_url, self.url) and page_url not in self.page_links:
+            self.page_links.append(page_url)
+
+
+def stream_table_links(html, url, chunk_size=STREAM_CHECK_CHUNK):
+    """Ссылки таблицы fresh-table через потоковый разбор страницы кусками chunk_size
+    (для сравнения с extract_table_links); None, если таблица не найдена"""
+    parser = TableLinkParser(url)
+    company_links = []
+    for start in range(0, len(html), chunk_size):
+        company_links.extend(parser.feed(html[start:start + chunk_size]))
+    company_links.extend(parser.close())
+    return company_links if parser.table_found else None
+
+
+def soup_company_details(html):
+    """Эталонный разбор страницы компании через BeautifulSoup"""
+    soup = BeautifulSoup(html, 'lxml')
+    dl_horizontal = soup.find(class_='dl-horizontal')
+    if not dl_horizontal:
+        return None
+
+    company_info = {}
+    dt_elements = dl_horizontal.find_all('dt')
+    dd_elements = dl_horizontal.find_all('dd')
+
+    for dt, dd in zip(dt_elements, dd_elements):
+        key = dt.get_text(strip=True)
+
+        if key == "Сайт:":
+            site_link = dd.find('a')
+            company_info['Сайт'] = site_link.get_text(strip=True) if site_link else ''
+        elif key == "Телефон:":
+            company_info['Телефон'] = dd.get_text(strip=True)
+        elif key == "E-mail:":
+            email_link = dd.find('a')
+            company_info['E-mail'] = email_link.get_text(strip=True) if email_link else ''
+
+        spans = dd.find_all('span', class_='label label-primary')
+        categories = [span.get_text(strip=True) for span in spans]
+        company_info['Рубрика'] = '; '.join(categories)
+
+    return company_info
+
+
+def soup_table_links(html, url):
+    """Эталонный разбор таблицы fresh-table через BeautifulSoup"""
+    soup = BeautifulSoup(html, 'lxml')
+    fresh_table = soup.find(id='fresh-table')
+    if not fresh_table:
+        return None
+
+    company_links = []
+    for row in fresh_table.find_all('tr'):
+        first_td = row.find('td')
+        if first_td:
+            link = first_td.find('a')
+            if link:
+                href = link.get('href', '')
+                text = link.get_text(strip=True)
+                full_url = urljoin(url, href) if href else ''
+                if full_url:
+                    company_links.append((text, full_url))
+    return company_links
+
+
+def iter_corpus(source):
+    """Страницы для сравнения: (url, html) из папки с .html файлами или из кэша страниц
+
+    Адреса страниц папки берутся из файла urls.json в ней; для файла, которого
+    там нет, адресом служит имя файла без расширения
+    """
+    if os.path.isdir(source):
+        urls = {}
+        urls_path = os.path.join(source, CORPUS_URLS)
+        if os.path.exists(urls_path):
+            with open(urls_path, encoding='utf-8') as f:
+                urls = json.load(f)
+        for name in sorted(os.listdir(source)):
+            if name.endswith('.html'):
+                with open(os.path.join(source, name), encoding='utf-8') as f:
+                    yield urls.get(name, name[:-len('.html')]), f.read()
+        return
+    db = sqlite3.connect(source)
+    try:
+        for url, body, encoding in db.execute('SELECT url, body, encoding FROM responses ORDER BY url'):
+            yield url, body.decode(encoding or 'utf-8', errors='replace')
+    finally:
+        db.close()
+
+
+def verify_corpus(source=CORPUS_PATH):
+    """Сравнение быстрого и эталонного разбора на сохраненных страницах.
+    Возвращает список расхождений [(url, функция, эталон, быстрый разбор)]"""
+    mismatches = []
+    checked = 0
+    for url, html in iter_corpus(source):
+        checked += 1
+        for name, fast, reference in (
+            ('company_details', extract_company_details(html), soup_company_details(html)),
+            ('table_links', extract_table_links(html, url), soup_table_links(html, url)),
+            ('table_links_stream', stream_table_links(html, url), soup_table_links(html, url)),
+        ):
+            if fast != reference:
+                mismatches.append((url, name, reference, fast))
+    print(f"Проверено страниц: {checked}, расхождений: {len(mismatches)}")
+    return mismatches
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(
+        description='Сравнение быстрого разбора страниц (lxml) с эталонным (BeautifulSoup)'
+    )
+    arg_parser.add_argument('source', nargs='?', default=CORPUS_PATH,
+                            help='папка с .html страницами или файл кэша страниц '
+                                 f'(по умолчанию - сохраненные страницы из папки corpus; кэш: {CACHE_PATH})')
+    args = arg_parser.parse_args()
+
+    mismatches = verify_corpus(args.source)
+    for url, name, reference, fast in mismatches:
+        print(f"\n{name}: {url}")
+        print(f"  эталон: {reference}")
+        print(f"  lxml:   {fast}")
+    raise SystemExit(1 if mismatches else 0)
+
+
+if __name__ == '__main__':
+    main()
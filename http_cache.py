@@ -0,0 +1,142 @@
+import sqlite3
+import threading
+import time
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# Файл кэша ответов сайта
+CACHE_PATH = 'http_cache.sqlite'
+# Сколько секунд ответ считается свежим и отдается без обращения к сайту
+CACHE_TTL = 24 * 60 * 60
+# Максимальный суммарный размер сохраненных страниц (байты)
+CACHE_MAX_SIZE = 1024 * 1024 * 1024
+
+
+class CacheMiss(requests.RequestException):
+    """Страницы нет в кэше, а обращаться к сайту запрещено (режим offline)"""
+
+
+class ResponseCache:
+    """Кэш HTTP ответов на диске (SQLite), ключ - URL страницы
+
+    Хранит ETag/Last-Modified для условных запросов, удаляет давно не
+    использованные страницы при превышении max_size
+    """
+
+    def __init__(self, path=CACHE_PATH, ttl=CACHE_TTL, max_size=CACHE_MAX_SIZE, offline=False):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.offline = offline
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                body BLOB NOT NULL,
+                encoding TEXT,
+                content_type TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            )
+        ''')
+        self.db.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed_at)')
+        self.db.commit()
+        self.total_size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def get(self, url):
+        """Запись кэша для url или None"""
+        with self.lock:
+            row = self.db.execute(
+                'SELECT body, encoding, content_type, etag, last_modified, fetched_at '
+                'FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute('UPDATE responses SET accessed_at = ? WHERE url = ?', (time.time(), url))
+            self.db.commit()
+        body, encoding, content_type, etag, last_modified, fetched_at = row
+        return {
+            'url': url,
+            'body': body,
+            'encoding': encoding,
+            'content_type': content_type,
+            'etag': etag,
+            'last_modified': last_modified,
+            'fetched_at': fetched_at
+        }
+
+    def is_fresh(self, entry):
+        return time.time() - entry['fetched_at'] < self.ttl
+
+    def conditional_headers(self, entry):
+        """Заголовки условного запроса для повторной проверки страницы"""
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url, response):
+        """Сохранение успешного ответа сайта"""
+        body = response.content
+        now = time.time()
+        with self.lock:
+            old = self.db.execute('SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            self.db.execute(
+                'INSERT OR REPLACE INTO responses '
+                '(url, body, encoding, content_type, etag, last_modified, fetched_at, accessed_at, size) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, body, response.encoding or response.apparent_encoding,
+                 response.headers.get('Content-Type'), response.headers.get('ETag'),
+                 response.headers.get('Last-Modified'), now, now, len(body))
+            )
+            self.total_size += len(body) - (old[0] if old else 0)
+            if self.total_size > self.max_size:
+                self._evict()
+            self.db.commit()
+
+    def revalidated(self, url, response):
+        """Страница не изменилась (304): продлеваем срок свежести записи"""
+        with self.lock:
+            self.db.execute(
+                'UPDATE responses SET fetched_at = ?, '
+                'etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE url = ?',
+                (time.time(), response.headers.get('ETag'), response.headers.get('Last-Modified'), url)
+            )
+            self.db.commit()
+
+    def _evict(self):
+        """Удаляем давно не использованные страницы, пока кэш не станет меньше 90% лимита"""
+        target = self.max_size * 0.9
+        rows = self.db.execute('SELECT url, size FROM responses ORDER BY accessed_at').fetchall()
+        for url, size in rows:
+            if self.total_size <= target:
+                break
+            self.db.execute('DELETE FROM responses WHERE url = ?', (url,))
+            self.total_size -= size
+
+    def close(self):
+        with self.lock:
+            self.db.close()
+
+
+def cached_response(entry):
+    """Объект requests.Response из записи кэша"""
+    response = requests.Response()
+    response.status_code = 200
+    response.url = entry['url']
+    response._content = entry['body']
+    response.encoding = entry['encoding']
+    response.headers = CaseInsensitiveDict()
+    if entry.get('content_type'):
+        response.headers['Content-Type'] = entry['content_type']
+    if entry.get('etag'):
+        response.headers['ETag'] = entry['etag']
+    if entry.get('last_modified'):
+        response.headers['Last-Modified'] = entry['last_modified']
+    return response
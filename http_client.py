@@ -0,0 +1,242 @@
+import codecs
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from http_cache import CacheMiss, cached_response
+from run_metrics import RunMetrics
+
+# Максимальное число запросов в секунду к одному хосту
+REQUESTS_PER_SECOND = 4.0
+# Общий лимит одновременных запросов к сайту за весь запуск
+MAX_CONCURRENT_REQUESTS = 8
+
+# Таймауты (секунды): на установку соединения и на чтение ответа
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+
+# Повторные попытки при временных ошибках сервера
+MAX_RETRIES = 5
+# Пауза перед повтором: BACKOFF_FACTOR * 2 ** (номер попытки - 1) секунд
+BACKOFF_FACTOR = 0.5
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Размер куска ответа при потоковой загрузке страницы (байты)
+STREAM_CHUNK_SIZE = 64 * 1024
+
+
+class RateLimiter:
+    """Ограничение частоты запросов к каждому хосту (общее для всех потоков)
+    и общего числа одновременных запросов"""
+
+    def __init__(self, requests_per_second=REQUESTS_PER_SECOND, max_concurrent=MAX_CONCURRENT_REQUESTS):
+        self.interval = 1.0 / requests_per_second if requests_per_second else 0.0
+        self.lock = threading.Lock()
+        self.next_slot = {}
+        self.max_concurrent = max_concurrent
+        self.in_flight = threading.BoundedSemaphore(max_concurrent) if max_concurrent else None
+
+    def wait(self, url):
+        """Ждем, пока для хоста из url не освободится очередной слот"""
+        if not self.interval:
+            return
+        host = urlparse(url).netloc
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot.get(host, now))
+            self.next_slot[host] = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+    @contextmanager
+    def slot(self, url):
+        """Занимаем место в общем бюджете запросов на время выполнения запроса"""
+        if self.in_flight:
+            self.in_flight.acquire()
+        try:
+            self.wait(url)
+            yield
+        finally:
+            if self.in_flight:
+                self.in_flight.release()
+
+
+def create_session(headers=None, pool_size=MAX_CONCURRENT_REQUESTS,
+                   max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR):
+    """Создание сессии с пулом keep-alive соединений и повторами запросов
+
+    Повторы выполняются с экспоненциальной паузой на ошибках соединения и
+    статусах из RETRY_STATUSES, заголовок Retry-After учитывается
+    """
+    retry = Retry(
+        total=max_retries,
+        backoff_factor=backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def retry_count(response):
+    """Число повторов urllib3, выполненных до получения ответа"""
+    retries = getattr(response.raw, 'retries', None)
+    return len(retries.history) if retries is not None else 0
+
+
+class HttpClient:
+    """Общий HTTP клиент парсера: одна сессия, таймауты, лимит запросов,
+    (необязательно) кэш ответов на диске и метрики запросов (metrics)"""
+
+    def __init__(self, headers=None, rate_limiter=None,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+                 max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, cache=None, metrics=None):
+        self.rate_limiter = rate_limiter or RateLimiter()
+        self.timeout = timeout
+        self.cache = cache
+        self.metrics = metrics or RunMetrics()
+        pool_size = self.rate_limiter.max_concurrent or MAX_CONCURRENT_REQUESTS
+        self.session = create_session(headers, pool_size, max_retries, backoff_factor)
+
+    def get(self, url):
+        """GET запрос; при ошибочном статусе после всех повторов бросает requests.HTTPError
+
+        Свежие страницы из кэша отдаются без обращения к сайту, устаревшие
+        проверяются условным запросом (If-None-Match / If-Modified-Since)
+        """
+        try:
+            return self._get(url)
+        except requests.RequestException as e:
+            self.metrics.error('fetch', url, e)
+            raise
+
+    def _get(self, url):
+        entry, cached = self._lookup(url)
+        if cached is not None:
+            return cached
+
+        response, start = self._send(url, entry)
+        elapsed = time.perf_counter() - start
+
+        if entry and response.status_code == 304:
+            self.metrics.request(url, 'revalidated', elapsed, 304, retries=retry_count(response))
+            self.cache.revalidated(url, response)
+            return cached_response(entry)
+
+        self.metrics.request(url, 'changed' if entry else 'miss', elapsed, response.status_code,
+                             len(response.content), retry_count(response))
+        response.raise_for_status()
+        if self.cache:
+            self.cache.store(url, response)
+        return response
+
+    def stream(self, url, chunk_size=STREAM_CHUNK_SIZE):
+        """GET запрос с выдачей текста страницы по кускам по мере загрузки
+
+        Кэш, лимит запросов и метрики - как у get. Страница из кэша выдается одним
+        куском, загруженная с сайта сохраняется в кэш после получения последнего куска
+        """
+        try:
+            yield from self._stream(url, chunk_size)
+        except requests.RequestException as e:
+            self.metrics.error('fetch', url, e)
+            raise
+
+    def _stream(self, url, chunk_size):
+        entry, cached = self._lookup(url)
+        if cached is not None:
+            yield cached.text
+            return
+
+        # Место в бюджете запросов занято до конца загрузки тела ответа: иначе потоковые
+        # загрузки списков шли бы сверх лимита одновременных запросов и размера пула соединений
+        with self._slot(url) as start:
+            response = self._request(url, entry, stream=True)
+            try:
+                yield from self._stream_body(url, entry, response, start, chunk_size)
+            finally:
+                response.close()
+
+    def _stream_body(self, url, entry, response, start, chunk_size):
+        if entry and response.status_code == 304:
+            self.metrics.request(url, 'revalidated', time.perf_counter() - start, 304,
+                                 retries=retry_count(response))
+            self.cache.revalidated(url, response)
+            yield cached_response(entry).text
+            return
+        if response.status_code >= 400:
+            self.metrics.request(url, 'changed' if entry else 'miss', time.perf_counter() - start,
+                                 response.status_code, len(response.content), retry_count(response))
+            response.raise_for_status()
+
+        decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+        chunks = []
+        for chunk in response.iter_content(chunk_size):
+            chunks.append(chunk)
+            text = decoder.decode(chunk)
+            if text:
+                yield text
+        text = decoder.decode(b'', final=True)
+        if text:
+            yield text
+
+        # Тело ответа целиком - для кэша и метрик
+        response._content = b''.join(chunks)
+        self.metrics.request(url, 'changed' if entry else 'miss', time.perf_counter() - start,
+                             response.status_code, len(response._content), retry_count(response))
+        if self.cache:
+            self.cache.store(url, response)
+
+    def _lookup(self, url):
+        """Запись кэша для url и готовый ответ из нее, если обращаться к сайту не нужно"""
+        entry = self.cache.get(url) if self.cache else None
+        if entry and (self.cache.offline or self.cache.is_fresh(entry)):
+            self.metrics.request(url, 'offline' if self.cache.offline else 'fresh')
+            return entry, cached_response(entry)
+        if self.cache and self.cache.offline:
+            raise CacheMiss(f"Страница отсутствует в кэше: {url}")
+        return entry, None
+
+    def _send(self, url, entry):
+        """Запрос к сайту (условный, если страница есть в кэше); ответ и момент начала запроса"""
+        with self._slot(url) as start:
+            response = self._request(url, entry)
+        return response, start
+
+    @contextmanager
+    def _slot(self, url):
+        """Место в бюджете запросов; выдает момент начала запроса"""
+        wait_start = time.perf_counter()
+        with self.rate_limiter.slot(url):
+            # Ожидание слота учитывается отдельно от времени запроса
+            start = time.perf_counter()
+            self.metrics.observe('rate_limit_wait', start - wait_start)
+            yield start
+
+    def _request(self, url, entry, stream=False):
+        conditional_headers = self.cache.conditional_headers(entry) if entry else None
+        return self.session.get(url, timeout=self.timeout, headers=conditional_headers, stream=stream)
+
+    def close(self):
+        self.session.close()
+        if self.cache:
+            self.cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
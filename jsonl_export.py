@@ -0,0 +1,90 @@
+import gzip
+import json
+import os
+import threading
+
+# Файл с данными всех компаний: одна строка JSON на компанию
+EXPORT_PATH = 'expo_links.jsonl'
+
+
+def open_jsonl(path, mode='rt'):
+    """Открытие JSONL файла, сжатого gzip (.gz) или обычного"""
+    if path.endswith('.gz'):
+        return gzip.open(path, mode, encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def company_record(exhibition, company):
+    """Запись компании (Company) вместе с данными ее выставки"""
+    return {
+        'exhibition_name': exhibition['text'],
+        'exhibition_url': exhibition['url'],
+        'text': company.text,
+        'url': company.url,
+        'details': company.details
+    }
+
+
+class JsonlWriter:
+    """Потоковая запись компаний в JSONL (по одной строке на компанию)
+
+    Файл с расширением .gz сжимается gzip. В режиме append записи дописываются
+    в конец существующего файла (продолжение прерванного запуска). Если передан
+    keep_exhibitions (адреса выставок), перед дописыванием из файла удаляются записи
+    остальных выставок: незавершенная выставка записывается заново, без повторов
+    """
+
+    def __init__(self, path=EXPORT_PATH, append=False, keep_exhibitions=None):
+        self.path = path
+        self.lock = threading.Lock()
+        if append and keep_exhibitions is not None and os.path.exists(path):
+            self._keep_only(keep_exhibitions)
+        self.file = open_jsonl(path, 'at' if append else 'wt')
+        self.count = 0
+
+    def _keep_only(self, exhibition_urls):
+        root, ext = os.path.splitext(self.path)
+        tmp_path = f'{root}.tmp{ext}'
+        with open_jsonl(self.path) as source, open_jsonl(tmp_path, 'wt') as target:
+            try:
+                for line in source:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Строка, оборванная при прерывании запуска
+                        continue
+                    if record.get('exhibition_url') in exhibition_urls:
+                        target.write(line if line.endswith('\n') else line + '\n')
+            except EOFError:
+                # Сжатый файл оборван при прерывании запуска: остальное записывается заново
+                pass
+        os.replace(tmp_path, self.path)
+
+    def write_exhibition(self, exhibition, companies):
+        """Запись всех компаний выставки; после записи данные сбрасываются на диск"""
+        with self.lock:
+            for company in companies:
+                record = company_record(exhibition, company)
+                self.file.write(json.dumps(record, ensure_ascii=False))
+                self.file.write('\n')
+                self.count += 1
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def iter_records(path=EXPORT_PATH):
+    """Ленивое чтение записей компаний из JSONL файла (обычного или .gz)"""
+    with open_jsonl(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
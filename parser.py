@@ -1,166 +1,217 @@
 import requests
 from bs4 import BeautifulSoup
-import json
+import argparse
 from urllib.parse import urljoin
-import time
-import pandas as pd
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
 import os
-from openpyxl.styles import Alignment, Font, PatternFill
-from openpyxl.utils import get_column_letter
-from openpyxl.drawing.image import Image
+import time
+from http_client import HttpClient, RateLimiter, REQUESTS_PER_SECOND, MAX_CONCURRENT_REQUESTS, RETRY_STATUSES
+from http_cache import ResponseCache, CACHE_PATH, CACHE_TTL
+from crawl_state import CrawlJournal, JOURNAL_PATH, exhibitor_digest
+from jsonl_export import JsonlWriter, EXPORT_PATH
+from extract import TableLinkParser, extract_company_details, list_page_key
+from run_metrics import REPORT_PATH, RunMetrics, profiling
+from company_index import CompanyIndex, MASTER_PATH
+from company_store import Company, CompanyStore, STORE_PATH
+from exhibition_selection import SELECTION_PATH, load_selection
+from excel_writer import (
+    StreamingExcelWriter, DEMO_DIR, EXCEL_DIR, TEMPLATE_PATH,
+    demo_filename, exhibition_filename, load_demo_mask, load_header_template
+)
 
-def create_top_rows(worksheet):
-    # Создаем первые 4 строки с контентом
-    rows = [
-        ["базы данных предприятий России", "www.базы-предприятий.рф", "SMS рассылка: 2,99 р. / сообщение", "", 
-         "Здесь может быть Ваша реклама", "", "", "Обновляется февраль и сентябрь", "", ""],
-        ["", "helper@aitera.com", "E-mail адресная рассылка: 3 р. 99 коп. / письмо", "", "", "", "", "", "", ""],
-        ["", "\nтелефон: 8495 223 35 57", "Холодные звонки: 17 990 р. / 500 диалогов", "", "", "", "", "", "", ""],
-        ["Название", "Рубрика", 
-         "Телефоны", "Email", "Сайт"]
-    ]
-    logo = Image('Рисунок1.jpg')
-    logo.width = 150
-    logo.height = 50
+# Количество потоков для параллельной загрузки страниц компаний
+MAX_WORKERS = 8
+# Количество выставок, обрабатываемых одновременно
+EXHIBITION_WORKERS = 3
 
-    # Создаем стиль для заголовков
-    header_fill = PatternFill(start_color='C5D9F1', end_color='C5D9F1', fill_type='solid')
-    times_new_roman_bold = Font(name='Times New Roman', bold=True)
-    
+class ExhibitionListError(Exception):
+    """Список компаний выставки не получен (ошибка загрузки или нет таблицы fresh-table):
+    выставка не считается обработанной и повторяется при --resume"""
 
-    # Устанавливаем высоту для первых 4 строк (30 пикселей ≈ 22.5 пунктов)
-    for row in range(1, 5):
-        worksheet.row_dimensions[row].height = 22.5
+def is_retryable(error):
+    """Временная ошибка загрузки (таймаут, обрыв соединения, 408, 429, 5xx), после которой
+    страницу стоит загрузить снова; другие ошибочные статусы (404 и т.п.) - окончательные"""
+    response = getattr(error, 'response', None)
+    if not isinstance(error, requests.HTTPError) or response is None:
+        return True
+    return response.status_code == 408 or response.status_code in RETRY_STATUSES or response.status_code >= 500
 
-    # Заполняем строки
-    for row_idx, row_data in enumerate(rows, 1):
-        for col_idx, value in enumerate(row_data, 1):
-            cell = worksheet.cell(row=row_idx, column=col_idx, value=value)
-            cell.font = Font(name='Calibri', bold=True)
-            
-            # Форматирование заголовков
-            if row_idx == 4:
-                cell.font = times_new_roman_bold  # Жирный Times New Roman для заголовков
-                cell.alignment = Alignment(horizontal='center')
-                cell.fill = header_fill
-            
-            # Форматирование специальных ячеек
-            if row_idx == 1:
-                if col_idx == 3:  # SMS рассылка
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                elif col_idx == 5:  # Здесь может быть Ваша реклама
-                    cell.alignment = Alignment(horizontal='center', vertical='center')
-                    cell.font = Font(name='Calibri', bold=True, color='1F497D', size=16)
-    
-    # Объединение ячеек для первой строки
-    worksheet.merge_cells(start_row=1, start_column=1, end_row=3, end_column=1)
-    worksheet.merge_cells(start_row=1, start_column=3, end_row=1, end_column=4)
-    worksheet.merge_cells(start_row=1, start_column=5, end_row=2, end_column=6)
-    worksheet.add_image(logo, 'A1')
-    
-    # Закрепляем первые 4 строки
-    worksheet.freeze_panes = "A5"
+def get_company_details(url, client):
+    """Получение детальной информации о компании из dl-horizontal
 
-def get_company_details(url, headers):
-    """Получение детальной информации о компании из dl-horizontal"""
+    {} - на странице нет данных (нет блока dl-horizontal, страница удалена),
+    None - временная ошибка загрузки, компания загружается снова при --resume
+    """
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        response = client.get(url)
         
-        soup = BeautifulSoup(response.text, 'lxml')
-        dl_horizontal = soup.find(class_='dl-horizontal')
+        # Быстрый разбор через lxml, результат совпадает с разбором BeautifulSoup
+        with client.metrics.timer('parse_details'):
+            company_info = extract_company_details(response.text)
         
-        if not dl_horizontal:
+        if company_info is None:
             print(f"Не найден dl-horizontal на странице {url}")
             return {}
-            
-        company_info = {}
-        
-        # Находим нужные поля по их названиям
-        dt_elements = dl_horizontal.find_all('dt')
-        dd_elements = dl_horizontal.find_all('dd')
-        
-        for dt, dd in zip(dt_elements, dd_elements):
-            key = dt.get_text(strip=True)
-            
-            # Сопоставляем поля с нужными нам данными
-            if key == "Сайт:":
-                site_link = dd.find('a')
-                company_info['Сайт'] = site_link.get_text(strip=True) if site_link else ''
-            elif key == "Телефон:":
-                company_info['Телефон'] = dd.get_text(strip=True)
-            elif key == "E-mail:":
-                email_link = dd.find('a')
-                company_info['E-mail'] = email_link.get_text(strip=True) if email_link else ''
-            
-            # Находим все span элементы с классом label label-primary
-            spans = dd.find_all('span', class_='label label-primary')
-            # Извлекаем только текст из каждого span
-            categories = [span.get_text(strip=True) for span in spans]
-            company_info['Рубрика'] = '; '.join(categories)
                 
         return company_info
         
     except requests.RequestException as e:
         print(f"Ошибка при получении данных компании с {url}: {e}")
-        return {}
+        return None if is_retryable(e) else {}
+
+class CompanyListPages:
+    """Список компаний выставки: страница /list и страницы ее постраничной навигации
+
+    Итерация выдает ссылки (название, url) из таблицы fresh-table по мере загрузки
+    и разбора строк, поэтому загрузка данных первых компаний начинается раньше,
+    чем загружен весь список. Страницы навигации загружаются по очереди;
+    компания, уже встреченная на предыдущих страницах, повторно не выдается.
+    Страницы сравниваются по list_page_key (ссылка навигации ?page=1 не загружает
+    первую страницу повторно); страница без новых строк не учитывается в pages,
+    и ее навигация не используется. Страницы, которые не удалось загрузить,
+    запоминаются в failed_pages: такой список неполный.
+    Полностью загруженный список запоминается, повторная итерация идет без запросов
+    """
+
+    def __init__(self, list_url, client):
+        self.list_url = list_url
+        self.client = client
+        self.table_found = False
+        self.pages = 0
+        self.failed_pages = []
+        self.links = None
+
+    def __iter__(self):
+        if self.links is not None:
+            yield from self.links
+            return
+        links = []
+        for link in self._iter_pages():
+            links.append(link)
+            yield link
+        self.links = links
 
-def get_table_links(url, headers):
-    """Получение ссылок на компании из таблицы на странице /list"""
+    def _iter_pages(self):
+        queue = deque([self.list_url])
+        seen_pages = {list_page_key(self.list_url)}
+        seen_companies = set()
+        while queue:
+            page_url = queue.popleft()
+            page = TableLinkParser(page_url)
+            page_companies = set()
+            parse_seconds = 0.0
+            try:
+                for text in self.client.stream(page_url):
+                    start = time.perf_counter()
+                    company_links = page.feed(text)
+                    parse_seconds += time.perf_counter() - start
+                    yield from self._new_links(company_links, seen_companies, page_companies)
+                start = time.perf_counter()
+                company_links = page.close()
+                parse_seconds += time.perf_counter() - start
+                yield from self._new_links(company_links, seen_companies, page_companies)
+            except requests.RequestException as e:
+                # Без первой страницы списка выставки нет; после ошибки на следующих
+                # загружаются остальные страницы, но список считается неполным
+                if page_url == self.list_url:
+                    raise
+                print(f"Ошибка при получении страницы списка {page_url}: {e}")
+                self.failed_pages.append(page_url)
+                continue
+            self.client.metrics.observe('parse_list', parse_seconds)
+            self.table_found = self.table_found or page.table_found
+            if not page_companies and page_url != self.list_url:
+                # Повтор уже загруженных строк (другой адрес той же страницы)
+                continue
+            self.pages += 1
+            seen_companies.update(page_companies)
+            for next_url in page.page_links:
+                key = list_page_key(next_url)
+                if key not in seen_pages:
+                    seen_pages.add(key)
+                    queue.append(next_url)
+
+    @staticmethod
+    def _new_links(company_links, seen_companies, page_companies):
+        for text, full_url in company_links:
+            if full_url not in seen_companies:
+                page_companies.add(full_url)
+                yield text, full_url
+
+def list_url(url):
+    """Адрес списка компаний выставки"""
+    return url if url.endswith('/list') else f"{url}/list"
+
+def get_table_links(url, client, max_workers=MAX_WORKERS, executor=None, journal=None, index=None,
+                    company_links=None):
+    """Получение ссылок на компании из таблицы на странице /list (со всех ее страниц)
+
+    Загрузка данных компании начинается сразу после разбора ее строки в таблице.
+    company_links - уже загруженный список (CompanyListPages), по умолчанию список загружается.
+    Если передан executor, детали компаний загружаются в нем (общий пул для всех выставок).
+    Если передан journal, каждая компания записывается в журнал сразу после загрузки,
+    а уже полученные ранее компании не загружаются повторно.
+    Если передан index (CompanyIndex), страница компании загружается один раз за запуск,
+    для других выставок данные берутся из индекса.
+    Если список не получен, бросает ExhibitionListError
+    """
+    exhibition_url = url
     try:
         # Добавляем /list к URL, если его там нет
-        if not url.endswith('/list'):
-            url = f"{url}/list"
-            
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        url = list_url(url)
         
-        soup = BeautifulSoup(response.text, 'lxml')
+        # Компании, уже сохраненные в журнале прерванного запуска
+        known_details = journal.known_details(exhibition_url) if journal else {}
         
-        # Сначала ищем таблицу fresh-table
-        fresh_table = soup.find(id='fresh-table')
-        if not fresh_table:
-            print(f"Таблица fresh-table не найдена на {url}")
-            return []
-            
-        # Находим все элементы tr в таблице
-        table_rows = fresh_table.find_all('tr')
+        def load_details(company_url, text):
+            print(f"Получение данных компании: {text}")
+            return get_company_details(company_url, client)
         
-        results = []
+        def fetch_details(numbered_link):
+            position, (text, full_url) = numbered_link
+            company_details = known_details.get(full_url)
+            if company_details is None:
+                if index is not None:
+                    company_details = index.fetch_once(full_url, lambda company_url: load_details(company_url, text))
+                else:
+                    company_details = load_details(full_url, text)
+            company_data = Company.from_details(text, full_url, company_details)
+            if journal:
+                # Номер строки обновляется и для известных компаний: список мог измениться
+                journal.company_done(exhibition_url, position, company_data)
+            return company_data
+        
+        # Ссылки на компании из таблицы fresh-table (потоковый разбор через lxml):
+        # map отправляет загрузку деталей по мере разбора строк и сохраняет порядок таблицы
+        if company_links is None:
+            company_links = CompanyListPages(url, client)
+        if executor is not None:
+            results = list(executor.map(fetch_details, enumerate(company_links)))
+        else:
+            with ThreadPoolExecutor(max_workers=max_workers) as own_executor:
+                results = list(own_executor.map(fetch_details, enumerate(company_links)))
         
-        for row in table_rows:
-            # Получаем первый элемент td в строке
-            first_td = row.find('td')
-            if first_td:
-                # Ищем ссылку в td
-                link = first_td.find('a')
-                if link:
-                    href = link.get('href', '')
-                    text = link.get_text(strip=True)
-                    full_url = urljoin(url, href) if href else ''
-                    if full_url:
-                        # Получаем детали компании сразу
-                        print(f"Получение данных компании: {text}")
-                        company_details = get_company_details(full_url, headers)
-                        
-                        company_data = {
-                            'text': text,
-                            'url': full_url,
-                            'details': company_details
-                        }
-                        results.append(company_data)
-                        time.sleep(0.5)  # Небольшая задержка между запросами
+        if not company_links.table_found:
+            raise ExhibitionListError(f"Таблица fresh-table не найдена на {url}")
+        if company_links.failed_pages:
+            # Загруженные компании уже в журнале, при --resume загружаются только недостающие
+            raise ExhibitionListError(
+                f"Не загружены страницы списка компаний: {', '.join(company_links.failed_pages)}"
+            )
+        if company_links.pages > 1:
+            print(f"Страниц в списке компаний: {company_links.pages} ({url})")
+        client.metrics.increment('list_pages', company_links.pages)
         
         return results
     except requests.RequestException as e:
-        print(f"Ошибка при получении ссылок из таблицы {url}: {e}")
-        return []
+        raise ExhibitionListError(f"Ошибка при получении ссылок из таблицы {url}: {e}") from e
 
-def get_exhibition_links(url, headers):
-    """Получение ссылок на выставки с главной страницы"""
+def get_exhibition_links(url, client):
+    """Получение ссылок на все выставки с главной страницы (выбор - см. ExhibitionSelection)"""
     try:
-        response = requests.get(url, headers=headers)
-        response.raise_for_status()
+        response = client.get(url)
         
         soup = BeautifulSoup(response.text, 'lxml')
         links = soup.find_all(class_='list-group-item list-group-item-action')
@@ -170,11 +221,6 @@ def get_exhibition_links(url, headers):
         for link in links:
             href = link.get('href', '')
             text = link.get_text(strip=True)
-            
-            # Проверяем, содержит ли текст 2025 и 2024
-            if not any(year in text for year in ['2024', '2025']):
-                continue
-                
             full_url = urljoin(url, href) if href else ''
             if full_url:
                 results.append({
@@ -187,114 +233,364 @@ def get_exhibition_links(url, headers):
         print(f"Ошибка при получении ссылок на выставки: {e}")
         return []
 
-def save_to_excel(exhibition_name, companies_data):
-    """Save companies data to Excel file with custom formatting"""
-    # Create DataFrame
-    excel_data = []
-    
-    for company in companies_data:
-        details = company.get('details', {})
-        excel_data.append({
-            'Название': company['text'],
-            'Рубрика': details.get('Рубрика', ''),
-            'Телефоны': details.get('Телефон', ''),
-            'Email': details.get('E-mail', ''),
-            'Сайт': details.get('Сайт', '')
-        })
-    
-    df = pd.DataFrame(excel_data)
+def save_to_excel(exhibition_name, companies_data, template=None, demo_mask=None):
+    """Потоковая запись компаний выставки (Company) в Excel файл с шапкой и автофильтром
+
+    template - готовая шапка листа (HeaderTemplate), по умолчанию из excel_template.json.
+    Если передан demo_mask (DemoMask), за тот же проход по компаниям записывается
+    и демо-версия файла в папку демо_версии
+    """
+    os.makedirs(EXCEL_DIR, exist_ok=True)
+    filename = exhibition_filename(exhibition_name)
     
-    # Create 'excel' directory if it doesn't exist
-    os.makedirs('excel', exist_ok=True)
-    filename = f'excel/Аитэра +7495 223 35 57 участники выставки {exhibition_name}.xlsx'
+    # Строки пишутся по мере поступления, вся книга в памяти не хранится
+    writers = [StreamingExcelWriter(filename, template)]
+    if demo_mask is not None:
+        os.makedirs(DEMO_DIR, exist_ok=True)
+        writers.append(StreamingExcelWriter(demo_filename(filename), template, mask=demo_mask))
     
-    with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-        # Сначала записываем пустой DataFrame чтобы создать лист
-        pd.DataFrame().to_excel(writer, sheet_name='Аитэра 7495 223 35 57')
-        
-        # Получаем объект листа
-        worksheet = writer.sheets['Аитэра 7495 223 35 57']
-        
-        # Создаем верхние строки
-        create_top_rows(worksheet)
-        
-        # Записываем данные компаний начиная с 5-й строки
-        times_new_roman = Font(name='Times New Roman')
-        for row_idx, row in enumerate(df.itertuples(), 5):
-            for col_idx, value in enumerate(row[1:], 1):
-                cell = worksheet.cell(row=row_idx, column=col_idx, value=value)
-                cell.font = times_new_roman  # Устанавливаем Times New Roman для всех данных
-        
-        # Настраиваем ширину колонок
-        column_widths = {
-            'A': 35, 'B': 25, 'C': 20, 
-            'D': 20, 'E': 10, 'F': 35,
-            'G': 35, 'H': 25, 'I': 25, 'J': 30
-        }
-        
-        for col, width in column_widths.items():
-            worksheet.column_dimensions[col].width = width
-            
-        # Добавляем возможность сортировки (AutoFilter)
-        last_row = len(excel_data) + 4  # 4 - это количество строк в шапке
-        worksheet.auto_filter.ref = f"A4:E{last_row}"
+    for company in companies_data:
+        for writer in writers:
+            writer.write_company(company)
+    for writer in writers:
+        writer.close()
     
     print(f"Excel file saved: {filename}")
+    if demo_mask is not None:
+        print(f"Demo version saved: {demo_filename(filename)}")
+
+def save_exhibition(exhibition, company_links, journal, exporter, template=None, demo_mask=None, metrics=None,
+                    store=None):
+    """Запись Excel файла, JSONL записей и колонок хранилища (store) выставки,
+    отметка о ее завершении в журнале
 
-def parse_expocentr():
-    # URL сайта
-    url = 'https://icatalog.expocentr.ru/ru'
+    Если данные части компаний не получены из-за временных ошибок, выставка не отмечается
+    завершенной: при --resume загружаются только недостающие компании. Компании, на страницах
+    которых данных нет, недостающими не считаются. Возвращает число недостающих компаний
+    """
+    start = time.perf_counter()
+    save_to_excel(exhibition['text'], company_links, template, demo_mask)
+    excel_seconds = time.perf_counter() - start
+    exporter.write_exhibition(exhibition, company_links)
+    if store is not None:
+        store.write_exhibition(exhibition, company_links, exhibition_filename(exhibition['text']))
+    if metrics is not None:
+        metrics.observe('excel_write', excel_seconds)
+        metrics.exhibition(exhibition['text'], excel_seconds=round(excel_seconds, 3))
+    missing = sum(1 for company in company_links if company.failed)
+    empty = sum(1 for company in company_links if not company.failed and not company.details)
+    if metrics is not None and empty:
+        metrics.increment('companies_without_details', empty)
+    if missing:
+        print(f"Не получены данные {missing} компаний выставки: {exhibition['text']}")
+    else:
+        journal.exhibition_done(exhibition, company_links)
+    return missing
+
+def check_exhibition(exhibition, client, journal, demo=True):
+    """Сравнение выставки с прошлым запуском (--incremental)
+
+    Возвращает (изменилась ли выставка, загруженный список компаний или None).
+    Выставка не изменилась, если совпадают ее название и участники, а файлы на месте;
+    список новой выставки не загружается заранее, он разбирается вместе с данными компаний
+    """
+    previous = journal.exhibition_state(exhibition['url'])
+    if previous is None:
+        return True, None
+    company_links = CompanyListPages(list_url(exhibition['url']), client)
+    companies = [Company(text, url) for text, url in company_links]
+    if not company_links.table_found:
+        raise ExhibitionListError(f"Таблица fresh-table не найдена на {company_links.list_url}")
+    if company_links.failed_pages:
+        raise ExhibitionListError(
+            f"Не загружены страницы списка компаний: {', '.join(company_links.failed_pages)}"
+        )
+    filename = exhibition_filename(exhibition['text'])
+    files = [filename, demo_filename(filename)] if demo else [filename]
+    unchanged = (
+        previous['text'] == exhibition['text']
+        and previous['list_digest'] == exhibitor_digest(companies)
+        and all(os.path.exists(path) for path in files)
+    )
+    return not unchanged, company_links
+
+def process_exhibition(exhibition, client, detail_executor, excel_executor, journal, exporter, template=None,
+                       index=None, demo_mask=None, incremental=False, store=None):
+    """Получение компаний одной выставки и постановка Excel файла в очередь записи
+
+    Если список компаний не получен, бросает ExhibitionListError: файлы выставки
+    не перезаписываются, а в журнале она не отмечается обработанной.
+    В режиме incremental выставка с прежним списком участников не обрабатывается заново,
+    ее компании берутся из журнала прошлого запуска
+    """
+    company_links = None
+    if incremental:
+        try:
+            changed, company_links = check_exhibition(exhibition, client, journal, demo_mask is not None)
+        except (requests.RequestException, ExhibitionListError) as e:
+            # Список не получен: остаются данные прошлого запуска, если они есть
+            print(f"Ошибка при проверке списка компаний выставки {exhibition['text']}: {e}")
+            changed = journal.exhibition_state(exhibition['url']) is None
+        if not changed:
+            print(f"\nВыставка не изменилась, пропускаем: {exhibition['text']}")
+            client.metrics.increment('exhibitions_unchanged')
+            exporter.write_exhibition(exhibition, journal.iter_companies(exhibition['url']))
+            if store is not None:
+                store.write_exhibition(exhibition, journal.iter_companies(exhibition['url']),
+                                       exhibition_filename(exhibition['text']))
+            if index is not None:
+                index.add_exhibition(exhibition, journal.iter_companies(exhibition['url']))
+            return None
+        journal.reopen_exhibition(exhibition['url'])
+    elif journal.is_exhibition_done(exhibition['url']):
+        print(f"\nВыставка уже обработана, пропускаем: {exhibition['text']}")
+        client.metrics.increment('exhibitions_skipped')
+        return None
     
+    print(f"\nПолучение компаний с выставки: {exhibition['text']}")
+    start = time.perf_counter()
+    try:
+        company_links = get_table_links(
+            exhibition['url'], client, executor=detail_executor, journal=journal, index=index,
+            company_links=company_links
+        )
+    except ExhibitionListError as e:
+        print(e)
+        client.metrics.increment('exhibitions_failed')
+        client.metrics.error('list', exhibition['url'], e)
+        raise
+    crawl_seconds = time.perf_counter() - start
+    print(f"Найдено {len(company_links)} компаний на выставке: {exhibition['text']}")
+    client.metrics.observe('exhibition_crawl', crawl_seconds)
+    client.metrics.exhibition(exhibition['text'], url=exhibition['url'], companies=len(company_links),
+                              crawl_seconds=round(crawl_seconds, 3))
+    if index is not None:
+        index.add_exhibition(exhibition, company_links)
+    
+    # Сохраняем в Excel в отдельном потоке, не задерживая сетевые запросы
+    return excel_executor.submit(
+        save_exhibition, exhibition, company_links, journal, exporter, template, demo_mask, client.metrics, store
+    )
+
+def parse_expocentr(url='https://icatalog.expocentr.ru/ru', use_cache=True, offline=False,
+                    cache_ttl=CACHE_TTL, resume=False, export_path=EXPORT_PATH,
+                    template_path=TEMPLATE_PATH, master_path=MASTER_PATH, demo=True,
+                    report_path=REPORT_PATH, requests_per_second=REQUESTS_PER_SECOND,
+                    max_concurrent=MAX_CONCURRENT_REQUESTS, selection=None, incremental=False,
+                    store_path=STORE_PATH, detail_workers=MAX_WORKERS, exhibition_workers=EXHIBITION_WORKERS):
+    """Обход каталога и запись файлов выставок
+
+    requests_per_second, max_concurrent - лимиты запросов к сайту (0 - без ограничения).
+    detail_workers - потоков загрузки страниц компаний (общий пул всех выставок),
+    exhibition_workers - выставок, обрабатываемых одновременно.
+    selection - выбор выставок (ExhibitionSelection), по умолчанию из exhibitions.json.
+    incremental - обрабатывать заново только новые выставки и выставки с изменившимся
+    списком участников, данные остальных берутся из журнала прошлого запуска.
+    store_path - колоночное хранилище компаний для анализа и демо-версий (None - не писать)
+    """
     # Заголовки для имитации браузера
     headers = {
         'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     }
     
+    # Шапка Excel файлов готовится один раз на весь запуск
+    template = load_header_template(template_path)
+    # Демо-версии пишутся вместе с полными файлами, без повторного чтения Excel
+    demo_mask = load_demo_mask(template_path) if demo else None
+    if selection is None:
+        selection = load_selection()
+    
+    # Кэш страниц: при повторном запуске неизмененные страницы не скачиваются заново,
+    # в режиме offline все данные берутся только из кэша
+    cache = ResponseCache(CACHE_PATH, ttl=cache_ttl, offline=offline) if use_cache or offline else None
+    
+    # Метрики запуска: запросы, этапы, время по выставкам (отчет в report_path)
+    metrics = RunMetrics()
+    
+    # Общая сессия и лимит запросов для всех потоков
+    client = HttpClient(headers, RateLimiter(requests_per_second, max_concurrent), cache=cache,
+                        metrics=metrics)
+    
+    # Журнал обработанных компаний и выставок; без --resume и --incremental начинаем обход заново
+    journal = CrawlJournal(JOURNAL_PATH)
+    # Колонки компаний каждой выставки для analyze_excel.py и encrypt_excel.py
+    store = CompanyStore(store_path) if store_path else None
+    if not resume and not incremental:
+        journal.reset()
+        # Хранилище очищается вместе с журналом: в нем остаются только выставки этого обхода
+        if store is not None:
+            store.reset()
+    
+    # Данные компаний записываются в JSONL по мере готовности выставок
+    # (в режиме incremental файл пишется заново, неизмененные выставки - из журнала).
+    # При продолжении в файле остаются только завершенные выставки, остальные записываются заново
+    append = resume and not incremental
+    exporter = JsonlWriter(
+        export_path, append=append,
+        keep_exhibitions={exhibition['url'] for exhibition in journal.done_exhibitions()} if append else None
+    )
+    
+    # Уникальные компании за запуск
+    index = CompanyIndex()
+    
     try:
+        # При продолжении добавляем в индекс компании уже обработанных выставок
+        # (в режиме incremental - по мере проверки выставок)
+        if resume and not incremental:
+            for exhibition in journal.done_exhibitions():
+                index.add_exhibition(exhibition, journal.iter_companies(exhibition['url']))
+        
         print("Шаг 1: Получение ссылок на выставки...")
-        exhibition_links = get_exhibition_links(url, headers)
+        catalogue = get_exhibition_links(url, client)
+        exhibition_links = selection.select(catalogue, url)
         
         if not exhibition_links:
             print("Ссылки на выставки не найдены!")
             return
             
-        print(f"Найдено {len(exhibition_links)} выставок на 2024 и 2025 год")
+        print(f"Выбрано {len(exhibition_links)} выставок из {len(catalogue)} ({selection.describe()})")
         
-        # Создаем структуру для итогового результата
-        result = []
+        if incremental:
+            # Сравнение выбранных выставок с выставками прошлого запуска
+            previous = {exhibition['url'] for exhibition in journal.done_exhibitions()}
+            selected = {exhibition['url'] for exhibition in exhibition_links}
+            new_count = len(selected - previous)
+            print(f"Новых выставок: {new_count}, выставок прошлого запуска нет в выборе: "
+                  f"{len(previous - selected)}")
+            metrics.increment('exhibitions_new', new_count)
         
-        # Обрабатываем каждую ссылку на выставку
-        for exhibition in exhibition_links:
-            exhibition_data = {
-                'exhibition_name': exhibition['text'],
-                'exhibition_url': exhibition['url'],
-                'companies': []
-            }
-            
-            # Получаем ссылки на компании со страницы выставки
-            print(f"\nПолучение компаний с выставки: {exhibition['text']}")
-            company_links = get_table_links(exhibition['url'], headers)
-            exhibition_data['companies'] = company_links
-            result.append(exhibition_data)
-            
-            # Сохраняем в Excel
-            save_to_excel(exhibition['text'], company_links)
-            
-            print(f"Найдено {len(company_links)} компаний")
-            
-            # Небольшая задержка между запросами к серверу
-            time.sleep(1)
+        excel_saves = []
+        # Выставки без списка компаний или с недополученными компаниями
+        failed = []
         
-        # Сохраняем в JSON файл
-        with open('expo_links.json', 'w', encoding='utf-8') as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-            
-        print(f"\nУспешно обработано {len(result)} выставок")
-        total_companies = sum(len(expo['companies']) for expo in result)
-        print(f"Всего собрано компаний: {total_companies}")
+        # Выставки обрабатываются параллельно: загрузка списка и деталей компаний
+        # одних выставок идет одновременно с записью Excel файлов других
+        with ThreadPoolExecutor(max_workers=detail_workers) as detail_executor, \
+                ThreadPoolExecutor(max_workers=1) as excel_executor, \
+                ThreadPoolExecutor(max_workers=exhibition_workers) as exhibition_executor:
+            try:
+                futures = [
+                    exhibition_executor.submit(
+                        process_exhibition, exhibition, client,
+                        detail_executor, excel_executor, journal, exporter, template, index, demo_mask,
+                        incremental, store
+                    )
+                    for exhibition in exhibition_links
+                ]
+                for exhibition, future in zip(exhibition_links, futures):
+                    try:
+                        excel_save = future.result()
+                    except ExhibitionListError:
+                        failed.append(exhibition['text'])
+                        continue
+                    if excel_save is not None:
+                        excel_saves.append((exhibition, excel_save))
+                
+                # Дожидаемся записи всех Excel файлов
+                for exhibition, excel_save in excel_saves:
+                    if excel_save.result():
+                        failed.append(exhibition['text'])
+            except BaseException:
+                # При ошибке или Ctrl-C отменяем задачи в очереди, все готовое уже в журнале
+                for executor in (exhibition_executor, detail_executor, excel_executor):
+                    executor.shutdown(wait=False, cancel_futures=True)
+                raise
+        
+        print(f"\nУспешно обработано {len(exhibition_links) - len(failed)} выставок")
+        if failed:
+            print(f"Не обработано полностью: {len(failed)} ({', '.join(failed)}). "
+                  "Для повтора запустите парсер с параметром --resume")
+        print(f"Всего собрано компаний: {journal.count_companies()}")
+        print(f"Данные компаний сохранены в файл: {export_path}")
+        if store is not None:
+            print(f"Колонки компаний для анализа и демо-версий сохранены в файл: {store_path}")
+        print(f"Повторных загрузок страниц компаний пропущено: {index.reused}")
+        unique_count = index.write_master(master_path)
+        print(f"Уникальных компаний: {unique_count}, сохранены в файл: {master_path}")
         
+    except KeyboardInterrupt:
+        print("\nОбработка прервана. Для продолжения запустите парсер с параметром --resume")
     except Exception as e:
         print(f"Произошла ошибка: {e}")
+        print("Для продолжения с места остановки запустите парсер с параметром --resume")
+    finally:
+        metrics.increment('detail_pages_reused', index.reused)
+        metrics.increment('unique_companies', index.unique_count())
+        client.close()
+        exporter.close()
+        journal.close()
+        if store is not None:
+            store.close()
+        metrics.write_report(report_path)
+        print(f"Отчет о запуске сохранен в файл: {report_path}")
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Парсер участников выставок Экспоцентра')
+    arg_parser.add_argument('--resume', action='store_true',
+                            help='продолжить прерванный запуск, пропуская уже обработанные компании и выставки')
+    arg_parser.add_argument('--gzip', action='store_true',
+                            help=f'сжать файлы с данными компаний ({EXPORT_PATH}.gz, {MASTER_PATH}.gz)')
+    arg_parser.add_argument('--incremental', action='store_true',
+                            help='обработать заново только новые выставки и выставки с изменившимся '
+                                 'списком участников')
+    arg_parser.add_argument('--selection', default=SELECTION_PATH,
+                            help='файл с выбором выставок: годы, шаблоны названий, адреса '
+                                 '(по умолчанию %(default)s)')
+    arg_parser.add_argument('--years',
+                            help='годы в названии выставки через запятую (all - все годы)')
+    arg_parser.add_argument('--match', action='append', metavar='ШАБЛОН',
+                            help='регулярное выражение для названия выставки (можно несколько)')
+    arg_parser.add_argument('--url', action='append', dest='urls', metavar='АДРЕС',
+                            help='адрес выставки (можно несколько); без --years и --match '
+                                 'обрабатываются только заданные выставки')
+    arg_parser.add_argument('--offline', action='store_true',
+                            help='не обращаться к сайту, собрать файлы только из кэша страниц')
+    arg_parser.add_argument('--no-cache', action='store_true',
+                            help='не использовать кэш страниц')
+    arg_parser.add_argument('--cache-ttl', type=float, default=CACHE_TTL / 3600,
+                            help='сколько часов страница в кэше считается свежей (по умолчанию %(default)s)')
+    arg_parser.add_argument('--template', default=TEMPLATE_PATH,
+                            help='файл с настройками шапки Excel файлов (по умолчанию %(default)s)')
+    arg_parser.add_argument('--no-demo', action='store_true',
+                            help='не создавать демо-версии Excel файлов')
+    arg_parser.add_argument('--detail-workers', type=int, default=MAX_WORKERS,
+                            help='потоков загрузки страниц компаний (по умолчанию %(default)s)')
+    arg_parser.add_argument('--exhibition-workers', type=int, default=EXHIBITION_WORKERS,
+                            help='выставок, обрабатываемых одновременно (по умолчанию %(default)s)')
+    arg_parser.add_argument('--rps', type=float, default=REQUESTS_PER_SECOND,
+                            help='запросов в секунду к сайту, 0 - без ограничения (по умолчанию %(default)s)')
+    arg_parser.add_argument('--max-concurrent', type=int, default=MAX_CONCURRENT_REQUESTS,
+                            help='одновременных запросов к сайту, 0 - без ограничения (по умолчанию %(default)s)')
+    arg_parser.add_argument('--report', default=REPORT_PATH,
+                            help='файл с отчетом о запуске в формате JSON (по умолчанию %(default)s)')
+    arg_parser.add_argument('--profile', metavar='ФАЙЛ',
+                            help='профилировать запуск (cProfile, все потоки) и сохранить статистику в файл')
+    arg_parser.add_argument('--log-level', default='WARNING',
+                            choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
+                            help='уровень структурированного лога: DEBUG - каждый запрос, INFO - выставки')
+    args = arg_parser.parse_args()
+    
+    # Структурированный лог: одна строка JSON на событие
+    logging.basicConfig(level=args.log_level, format='%(message)s')
+    
+    years = None
+    if args.years is not None:
+        years = [] if args.years == 'all' else [year.strip() for year in args.years.split(',') if year.strip()]
+    
+    options = dict(
+        use_cache=not args.no_cache, offline=args.offline, cache_ttl=args.cache_ttl * 3600,
+        resume=args.resume, export_path=EXPORT_PATH + '.gz' if args.gzip else EXPORT_PATH,
+        template_path=args.template, master_path=MASTER_PATH + '.gz' if args.gzip else MASTER_PATH,
+        demo=not args.no_demo, report_path=args.report,
+        selection=load_selection(args.selection, years, args.match, args.urls), incremental=args.incremental,
+        requests_per_second=args.rps, max_concurrent=args.max_concurrent,
+        detail_workers=args.detail_workers, exhibition_workers=args.exhibition_workers
+    )
+    if args.profile:
+        with profiling(args.profile):
+            parse_expocentr(**options)
+    else:
+        parse_expocentr(**options)
 
 if __name__ == '__main__':
-    parse_expocentr() 
\ No newline at end of file
+    main() 
\ No newline at end of file
@@ -0,0 +1,196 @@
+import cProfile
+import json
+import logging
+import pstats
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Файл с отчетом о запуске парсера
+REPORT_PATH = 'run_report.json'
+
+# Границы интервалов гистограмм длительности (миллисекунды)
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+# Структурированные события (одна строка JSON на событие)
+logger = logging.getLogger('expo_parser.metrics')
+
+
+def log_event(event, level=logging.DEBUG, **fields):
+    """Событие в структурированный лог: {"event": ..., поля...}"""
+    if logger.isEnabledFor(level):
+        logger.log(level, json.dumps({'event': event, **fields}, ensure_ascii=False))
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными интервалами"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, ms):
+        index = 0
+        while index < len(self.buckets) and ms > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    def report(self):
+        labels = [f'<={bound}' for bound in self.buckets] + [f'>{self.buckets[-1]}']
+        return {
+            'count': self.count,
+            'total_ms': round(self.total, 1),
+            'mean_ms': round(self.total / self.count, 1) if self.count else None,
+            'min_ms': round(self.min, 1) if self.min is not None else None,
+            'max_ms': round(self.max, 1) if self.max is not None else None,
+            'buckets_ms': dict(zip(labels, self.counts))
+        }
+
+
+class RunMetrics:
+    """Метрики запуска (общие для всех потоков): длительности этапов, запросы,
+    объем загруженных данных, повторы и ошибки, работа кэша, время по выставкам"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.started = time.monotonic()
+        self.stages = {}
+        self.counters = {}
+        self.cache = {}
+        self.statuses = {}
+        self.errors = {}
+        self.bytes_received = 0
+        self.exhibitions = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds * 1000)
+
+    @contextmanager
+    def timer(self, stage):
+        """Длительность блока в гистограмму этапа stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def increment(self, name, value=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def request(self, url, cache_status, seconds=None, status=None, size=0, retries=0):
+        """Запрос страницы: cache_status - fresh, offline, revalidated, changed или miss;
+        seconds, status и size - только для запросов к сайту"""
+        with self.lock:
+            self.cache[cache_status] = self.cache.get(cache_status, 0) + 1
+            if status is not None:
+                self.statuses[str(status)] = self.statuses.get(str(status), 0) + 1
+            self.bytes_received += size
+            if retries:
+                self.counters['retries'] = self.counters.get('retries', 0) + retries
+        if seconds is not None:
+            self.observe('fetch', seconds)
+        log_event('request', url=url, cache=cache_status, status=status,
+                  ms=round(seconds * 1000, 1) if seconds is not None else None, bytes=size, retries=retries)
+
+    def error(self, stage, url, exc):
+        name = type(exc).__name__
+        with self.lock:
+            stage_errors = self.errors.setdefault(stage, {})
+            stage_errors[name] = stage_errors.get(name, 0) + 1
+        log_event('error', logging.WARNING, stage=stage, url=url, error=name, message=str(exc))
+
+    def exhibition(self, name, **fields):
+        """Время и число компаний по выставке (поля дополняются по мере этапов)"""
+        with self.lock:
+            self.exhibitions.setdefault(name, {}).update(fields)
+        log_event('exhibition', logging.INFO, name=name, **fields)
+
+    def report(self):
+        with self.lock:
+            cache_total = sum(self.cache.values())
+            served_from_cache = sum(self.cache.get(key, 0) for key in ('fresh', 'offline', 'revalidated'))
+            return {
+                'started_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.started_at)),
+                'wall_seconds': round(time.monotonic() - self.started, 3),
+                'requests': {
+                    'total': cache_total,
+                    'network': sum(self.statuses.values()),
+                    'statuses': dict(self.statuses),
+                    'bytes_received': self.bytes_received,
+                    'retries': self.counters.get('retries', 0)
+                },
+                'cache': {
+                    **self.cache,
+                    'hit_rate': round(served_from_cache / cache_total, 3) if cache_total else None
+                },
+                'errors': {stage: dict(errors) for stage, errors in self.errors.items()},
+                'counters': {name: value for name, value in self.counters.items() if name != 'retries'},
+                'stages': {stage: histogram.report() for stage, histogram in self.stages.items()},
+                'exhibitions': {name: dict(fields) for name, fields in self.exhibitions.items()}
+            }
+
+    def write_report(self, path=REPORT_PATH):
+        report = self.report()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        return report
+
+
+@contextmanager
+def profiling(path):
+    """Профилирование cProfile всех потоков, созданных внутри блока; статистика в файл path
+
+    До Python 3.12 профиль ведется в каждом потоке отдельно и затем объединяется.
+    С Python 3.12 cProfile работает через sys.monitoring: один профиль охватывает
+    все потоки процесса, а второй активный профиль запустить нельзя (ValueError)
+
+    Просмотр: python -m pstats path
+    """
+    profiles = [cProfile.Profile()]
+    lock = threading.Lock()
+    per_thread = sys.version_info < (3, 12)
+
+    def start_thread_profile(*args):
+        # Вызывается в новом потоке на первом событии профилирования
+        sys.setprofile(None)
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Уже активен другой профилировщик: поток работает без своего профиля
+            return
+        with lock:
+            profiles.append(profile)
+
+    if per_thread:
+        threading.setprofile(start_thread_profile)
+    profiles[0].enable()
+    try:
+        yield
+    finally:
+        profiles[0].disable()
+        if per_thread:
+            threading.setprofile(None)
+        # Потоки пулов к этому моменту завершены, их профили можно собрать
+        stats = pstats.Stats(profiles[0])
+        with lock:
+            for profile in profiles[1:]:
+                profile.create_stats()
+                stats.add(profile)
+        stats.dump_stats(path)
+        print(f"Профиль сохранен в файл: {path}")